@@ -1,13 +1,109 @@
-from flask import Flask, jsonify, request
-from utils import calculate_blend_percentage, find_top_rated_common_films, scrape_profile_avatar, scrape_movie_poster, get_watchlist_party_results
+import time
+
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from jobs import submit, get_job
+from serialize import dumps, records
+import metrics
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
-import json
+
+# The data modules (pandas, numpy, the scrapers) are imported by the handlers that use them,
+# so a worker boots and answers /health without loading them
 
 app = Flask(__name__)
 CORS(app)  # To allow cross-origin requests from React frontend
 
+MAX_BLEND_MATRIX_USERS = 50
+
+@app.before_request
+def start_request_timing():
+    """Time every request; profile it too when asked with ?profile=1 or an X-Blend-Profile header.
+
+    Profiling is opt-in (BLEND_ALLOW_PROFILING=1), so stage timings aren't exposed in production.
+    """
+    g.started_at = time.perf_counter()
+    g.profile_token = None
+    if metrics.PROFILING_ALLOWED and (request.args.get('profile') == '1' or request.headers.get('X-Blend-Profile')):
+        g.profile, g.profile_token = metrics.start_profile()
+
+@app.after_request
+def record_request_timing(response):
+    metrics.request_seconds.observe(time.perf_counter() - g.started_at,
+                                    endpoint=request.endpoint or 'unknown', status=response.status_code)
+    if g.profile_token is not None:
+        response.headers['Server-Timing'] = g.profile.server_timing()
+    return response
+
+@app.teardown_request
+def finish_request_profile(exc):
+    token = g.pop('profile_token', None)
+    if token is not None:
+        metrics.finish_profile(token)
+
+def respond(payload):
+    """A JSON response (orjson when installed), timed as the 'serialize' span."""
+    with metrics.span('serialize'):
+        return Response(dumps(payload), mimetype='application/json')
+
+def requested_fields(data, available):
+    """The optional "fields" projection from a request body: a list of column names, or None for all.
+
+    Names outside `available` are rejected rather than silently dropped from the rows.
+    """
+    fields = data.get('fields')
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(field, str) for field in fields)):
+        raise ValueError("fields must be a list of column names")
+    unknown = [field for field in fields or () if field not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(available)}")
+    return fields
+
+def requested_usernames(data):
+    """The "usernames" list from a request body, without duplicates (first occurrence kept)."""
+    usernames = data.get('usernames', [])
+    if not isinstance(usernames, list) or not all(isinstance(username, str) and username.strip()
+                                                  for username in usernames):
+        raise ValueError("usernames must be a list of non-empty strings")
+    return list(dict.fromkeys(usernames))
+
+def diary_window(data):
+    """The optional diary window from a request body: "since" ('YYYY-MM-DD') or "diary_years" (a positive number)."""
+    from utils import diary_window_start
+    years = data.get('diary_years')
+    if years is not None and (not isinstance(years, (int, float)) or isinstance(years, bool) or years <= 0):
+        raise ValueError("diary_years must be a positive number")
+    try:
+        return diary_window_start(data.get('since'), years)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError("since must be a date formatted as YYYY-MM-DD")
+
+def respond_or_error(payload, *args):
+    """respond(payload(*args)), with a 404 naming the user whose profile couldn't be loaded and a 500 otherwise."""
+    from utils import ProfileNotFound
+    try:
+        return respond(payload(*args))
+    except ProfileNotFound as e:
+        return jsonify({"error": str(e), "username": e.username}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def stream_events(events):
+    """Send events as newline-delimited JSON while they are produced."""
+    from streaming import ndjson
+    return Response(stream_with_context(ndjson(event) for event in events), mimetype='application/x-ndjson')
+
+def enqueue(kind, fn, *args):
+    """Run a payload function as a background job; the client polls /api/jobs/<job_id>."""
+    job_id = submit(kind, fn, *args)
+    return jsonify({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+
+def blend_payload(username1, username2):
+    from utils import calculate_blend_percentage
+    return {"blend_percentage": calculate_blend_percentage(username1, username2)}
+
+def blend_matrix_payload(usernames):
+    from profiles import blend_matrix
+    return {"usernames": usernames, "blend_matrix": blend_matrix(usernames)}
+
 @app.route('/api/calculate_blend', methods=['POST'])
 def calculate_blend():
     """API endpoint to calculate blend percentage between two users."""
@@ -18,12 +114,33 @@ def calculate_blend():
     if not username1 or not username2:
         return jsonify({"error": "Usernames are required"}), 400
 
-    try:
-        blend_percentage = calculate_blend_percentage(username1, username2)
-        return jsonify({"blend_percentage": blend_percentage})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    if data.get('stream'):
+        from streaming import stream_blend
+        return stream_events(stream_blend(username1, username2))
+    if data.get('async'):
+        return enqueue('calculate_blend', blend_payload, username1, username2)
+
+    return respond_or_error(blend_payload, username1, username2)
     
+@app.route('/api/blend_matrix', methods=['POST'])
+def calculate_blend_matrix():
+    """API endpoint to calculate the pairwise blend matrix for a group of users."""
+    data = request.get_json()
+    try:
+        usernames = requested_usernames(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if len(usernames) < 2:
+        return jsonify({"error": "At least two usernames are required"}), 400
+    if len(usernames) > MAX_BLEND_MATRIX_USERS:
+        return jsonify({"error": f"At most {MAX_BLEND_MATRIX_USERS} usernames are allowed"}), 400
+
+    if data.get('async'):
+        return enqueue('blend_matrix', blend_matrix_payload, usernames)
+
+    return respond_or_error(blend_matrix_payload, usernames)
+
 @app.route('/api/profile_avatars', methods=['POST'])
 def profile_avatars():
     """API endpoint to get profile avatars for users."""
@@ -35,13 +152,29 @@ def profile_avatars():
         return jsonify({"error": "Usernames are required"}), 400
 
     try:
-        avatar1 = scrape_profile_avatar(username1)
-        avatar2 = scrape_profile_avatar(username2)
-        return jsonify({"avatar1": avatar1, "avatar2": avatar2})
+        from images import resolve_avatars
+        avatars = resolve_avatars([username1, username2])
+        return jsonify({"avatar1": avatars[username1], "avatar2": avatars[username2]})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def top_common_films_payload(username1, username2, top_n, fields=None, since=None):
+    from images import resolve_posters
+    from utils import find_top_rated_common_films
+    top_common_df, _ = find_top_rated_common_films(username1, username2, top_n=top_n, since=since)
+    top_common_films = records(top_common_df, fields)
+    if fields is not None and 'image_url' not in fields:
+        return {"top_common_films": top_common_films}
+
+    links = (top_common_df['link_user1'] if 'link_user1' in top_common_df else top_common_df['link']).tolist()
+    posters = resolve_posters(links)
+    for film, link in zip(top_common_films, links):
+        image_url = posters[link]
+        film['image_url'] = image_url if image_url and image_url.startswith("http") else 'fallback-image-url.jpg'
+
+    return {"top_common_films": top_common_films}
+
 @app.route('/api/top_common_films', methods=['POST'])
 def top_common_films():
     """API endpoint to get the top common films between two users."""
@@ -52,26 +185,17 @@ def top_common_films():
 
     if not username1 or not username2:
         return jsonify({"error": "Usernames are required"}), 400
-
+    from utils import TOP_COMMON_FILMS_FIELDS
     try:
-        top_common_df, _ = find_top_rated_common_films(username1, username2, top_n=top_n)
-        top_common_df = top_common_df.where(pd.notnull(top_common_df), None)
-        top_common_films = top_common_df.to_dict(orient='records')
-
-        for film in top_common_films:
-            try:
-                film_url = f"https://letterboxd.com{film['link_user1'] if 'link_user1' in film else film['link']}"
-                image_url = scrape_movie_poster(film_url)
-                print(f" {film['title']} poster: {image_url}")
-                film['image_url'] = image_url if image_url.startswith("http") else 'fallback-image-url.jpg'
-            except Exception as e:
-                print(f"Poster scraping failed for {film.get('title')}: {e}")
-                film['image_url'] = 'fallback-image-url.jpg'
-
-        return jsonify({"top_common_films": top_common_films})
+        fields = requested_fields(data, TOP_COMMON_FILMS_FIELDS)
+        since = diary_window(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    if data.get('async'):
+        return enqueue('top_common_films', top_common_films_payload, username1, username2, top_n, fields, since)
+
+    return respond_or_error(top_common_films_payload, username1, username2, top_n, fields, since)
     
 
 @app.route('/api/scrape_poster', methods=['POST'])
@@ -83,49 +207,70 @@ def scrape_poster():
         return jsonify({"error": "film_url is required"}), 400
 
     try:
-        image_url = scrape_movie_poster(film_url)
+        from images import get_movie_poster
+        image_url = get_movie_poster(film_url)
         return jsonify({"image_url": image_url}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 
+def watchlist_party_payload(usernames, genre, director, decade, min_runtime, max_runtime, min_users=None, fields=None):
+    from utils import get_watchlist_party_results
+    results = get_watchlist_party_results(
+        usernames, genre, director, decade, min_runtime, max_runtime, min_users, fields
+    )
+    return {'common_films': results}
+
 @app.route('/api/watchlist-party', methods=['POST'])
 def watchlist_party():
     data = request.json
-    usernames = data.get('usernames', [])
     genre = data.get('genre')
     director = data.get('director')
     decade = data.get('decade')
     min_runtime = data.get('min_runtime')
     max_runtime = data.get('max_runtime')
+    min_users = data.get('min_users')  # optional "on at least K of the N watchlists" mode
 
-    # Debugging: Check received filters
-    print(f"Received filters - Genre: {genre}, Director: {director}, Decade: {decade}, Min Runtime: {min_runtime}, Max Runtime: {max_runtime}")
+    try:
+        usernames = requested_usernames(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if min_users is not None and (not isinstance(min_users, int) or isinstance(min_users, bool) or min_users < 1):
+        return jsonify({"error": "min_users must be a positive integer"}), 400
+    if min_users is not None and min_users > len(usernames):
+        return jsonify({"error": f"min_users can't be more than the {len(usernames)} usernames given"}), 400
+    from utils import WATCHLIST_PARTY_FIELDS
+    available = [field for field in WATCHLIST_PARTY_FIELDS if field != 'overlap' or min_users is not None]
+    try:
+        fields = requested_fields(data, available)  # optional projection, e.g. ["title_x", "decade", "image_url"]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if data.get('stream'):
+        from streaming import stream_watchlist_party
+        return stream_events(stream_watchlist_party(usernames, genre, director, decade, min_runtime, max_runtime, min_users,
+                                                    fields))
+    if data.get('async'):
+        return enqueue('watchlist_party', watchlist_party_payload,
+                       usernames, genre, director, decade, min_runtime, max_runtime, min_users, fields)
+
+    return respond_or_error(watchlist_party_payload,
+                            usernames, genre, director, decade, min_runtime, max_runtime, min_users, fields)
 
-    results = get_watchlist_party_results(
-        usernames, genre, director, decade, min_runtime, max_runtime
-    )
 
-    # Debugging: Check results after filtering
-    print(f"Filtered movies count: {len(results)}")
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Poll a background job started with "async": true. Includes the result once done."""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
 
-    # Convert NaN to None before returning JSON
-    # safe_results = json.loads(json.dumps(results, default=lambda x: None if x != x else x))
-    # Convert NaN to None before returning JSON
-    def replace_nan(obj):
-        if isinstance(obj, float) and np.isnan(obj):
-            return None
-        elif isinstance(obj, dict):
-            return {k: replace_nan(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [replace_nan(i) for i in obj]
-        return obj
 
-    results_dict = results.to_dict(orient='records') if hasattr(results, 'to_dict') else results
-    safe_results = replace_nan(results_dict)
-    print(f"Returning {len(safe_results)} films")
-    print("Sample output:", safe_results[:1])
-    return jsonify({'common_films': safe_results})
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target: request, fetch, cache and stage-timing metrics, summed over gunicorn's workers."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/health')
@@ -133,4 +278,5 @@ def health_check():
     return {"status": "ok"}, 200
 
 if __name__ == '__main__':
+    # Development server; production runs gunicorn -c gunicorn.conf.py wsgi:app
     app.run(host='0.0.0.0', port=5000)
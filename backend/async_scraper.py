@@ -0,0 +1,313 @@
+"""The scrapers: asyncio on one pooled keep-alive HTTP client, with utils' sync API on top.
+
+The client lives on a single background event loop so connections survive across Flask
+requests; synchronous code hands coroutines to it with run() / run_all() (utils.scrape_films
+and friends are thin wrappers over the coroutines here). Cache reads and writes and HTML
+parsing block, so they run on worker threads via asyncio.to_thread, keeping the loop free
+for the other scrapes in flight.
+"""
+import asyncio
+import threading
+import time
+
+import httpx
+import pandas as pd
+
+from cache import get_cache, PROFILE_TTL, PAGE_TTL, FULL_SYNC_INTERVAL
+from fetcher import rate_limiter, backoff_delay, MAX_FETCH_WORKERS
+from jobs import coalesce_async
+from parsers import get_parser
+from metrics import span, current_profile, with_profile, fetch_seconds, fetch_responses, fetch_retries, fetch_errors, scraped_entries
+from utils import (
+    DOMAIN, HEADERS, CachedResponse, ProfileNotFound, load_profile_snapshot, snapshot_frame, store_cached_profile,
+    merge_snapshot_delta, list_page_url, LIST_COLUMNS, before_window, diary_window,
+)
+
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+_slots = None
+_page_listeners = {}  # coalescing key -> on_page callbacks of everyone waiting on that scrape
+
+
+def get_loop():
+    """Return the background event loop, starting its thread on first use."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='scrape-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+def schedule(coro):
+    """Start a coroutine on the background loop, returning a concurrent.futures.Future for its result."""
+    profile = current_profile()
+    if profile is not None:  # keep recording spans into the calling request's profile
+        coro = with_profile(coro, profile)
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+def run(coro):
+    """Run a coroutine on the background loop and block until it finishes."""
+    return schedule(coro).result()
+
+def run_all(*coros):
+    """Run several coroutines concurrently, returning their results in order."""
+    async def gather():
+        return await asyncio.gather(*coros)
+    return run(gather())
+
+def get_client():
+    # Only ever called from the loop thread, so no locking is needed
+    global _client, _slots
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=10,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=MAX_FETCH_WORKERS, max_keepalive_connections=MAX_FETCH_WORKERS),
+        )
+        _slots = asyncio.Semaphore(MAX_FETCH_WORKERS)
+    return _client
+
+
+async def fetch_url_async(url, max_retries=3, revalidate=True):
+    """Fetch a page through the shared per-host rate limiter, retrying with backoff.
+
+    Any cached copy of the page is revalidated with If-None-Match / If-Modified-Since.
+    Returns None on a 404 or once the retries run out.
+    """
+    with span('fetch'):
+        return await fetch_url_attempts(url, max_retries, revalidate)
+
+async def fetch_url_attempts(url, max_retries, revalidate):
+    client = get_client()
+    cache_key = f"page:{url}"
+    cached = await asyncio.to_thread(get_cache().get, cache_key, include_stale=True) if revalidate else None
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    for attempt in range(1, max_retries + 1):
+        wait = rate_limiter.bucket(url).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            async with _slots:
+                start = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                fetch_seconds.observe(time.perf_counter() - start, client='async')
+            fetch_responses.inc(status=response.status_code)
+            if response.status_code == 304 and cached:
+                return CachedResponse(url, cached['content'])
+            if response.status_code == 200:
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                if revalidate and (etag or last_modified):
+                    await asyncio.to_thread(
+                        get_cache().set,
+                        cache_key,
+                        {'etag': etag, 'last_modified': last_modified, 'content': response.text},
+                        PAGE_TTL,
+                    )
+                return response
+            elif response.status_code == 404:
+                return None
+            print(f"Attempt {attempt}: status {response.status_code} on {url}")
+        except httpx.HTTPError as e:
+            fetch_errors.inc()
+            print(f"Error: {e} on {url}")
+        if attempt < max_retries:
+            fetch_retries.inc()
+            await asyncio.sleep(backoff_delay(attempt))
+    return None
+
+
+async def parse_list_page(list_type, response):
+    """Parse one list page off the loop: (rows as dicts keyed by LIST_COLUMNS[list_type], last_page)."""
+    page_rows, last_page = await asyncio.to_thread(get_parser().list_page, list_type, response.content)
+    columns = LIST_COLUMNS[list_type]
+    return [dict(zip(columns, row)) for row in page_rows], last_page
+
+async def fetch_list_page_async(list_type, url):
+    """Fetch and parse one list page: (rows, last_page), or None if it can't be fetched."""
+    response = await fetch_url_async(url)
+    if not response:
+        return None
+    return await parse_list_page(list_type, response)
+
+async def scrape_pages_async(list_type, page_url, on_page=None):
+    """Fetch page 1, then every remaining page concurrently, parsing them in page order as they land.
+
+    on_page(page, last_page, rows) is called for each parsed page. Returns (rows, numbers of
+    the pages that failed), or (None, [1]) if page 1 fails.
+    """
+    first_response = await fetch_url_async(page_url(1))
+    if not first_response:
+        return None, [1]
+
+    rows, last_page = await parse_list_page(list_type, first_response)
+    all_rows = list(rows)
+    if on_page:
+        on_page(1, last_page, rows)
+
+    fetches = [asyncio.ensure_future(fetch_url_async(page_url(page))) for page in range(2, last_page + 1)]
+    failed_pages = []
+    for page, fetch in enumerate(fetches, start=2):
+        response = await fetch
+        if not response:
+            failed_pages.append(page)
+            continue
+        rows, _ = await parse_list_page(list_type, response)
+        all_rows.extend(rows)
+        if on_page:
+            on_page(page, last_page, rows)
+    return all_rows, failed_pages
+
+async def sync_profile_incremental_async(snapshot, list_type, page_url):
+    """Walk pages newest-first until one contains an already-known id, then merge the delta.
+
+    Rows are keyed on their first column ('id'). Rows seen on the walked pages replace their
+    snapshot copies, so rating edits on recent entries are picked up too. Returns None when
+    any walked page can't be fetched so the caller can fall back to a full scrape; merging
+    only part of the delta would lose the rows in between for good.
+    """
+    known_ids = {row['id'] for row in snapshot['rows']}
+    delta = []
+    page = 1
+    while True:
+        response = await fetch_url_async(page_url(page))
+        if not response:
+            return None
+        rows, last_page = await parse_list_page(list_type, response)
+        delta.extend(rows)
+        if not rows or any(row['id'] in known_ids for row in rows) or page >= last_page:
+            break
+        page += 1
+    scraped_entries.inc(len(delta), list=list_type)
+    return await asyncio.to_thread(merge_snapshot_delta, snapshot, delta)
+
+async def scrape_list_async(list_type, username, use_cache=True, incremental=True, on_page=None):
+    """A user's films/diary/watchlist as a DataFrame, with concurrent callers for the same list sharing one scrape.
+
+    on_page(page, last_page, rows) is called as pages are parsed; a caller that joins a
+    scrape already running only hears about the pages parsed after it joined.
+    """
+    if not use_cache:
+        return await scrape_list_uncoalesced_async(list_type, username, use_cache, incremental, on_page)
+    key = ('profile', list_type, username.lower(), incremental)
+
+    def publish(*page):
+        for listener in list(_page_listeners.get(key, ())):
+            listener(*page)
+
+    if on_page:
+        _page_listeners.setdefault(key, []).append(on_page)
+    try:
+        return await coalesce_async(
+            key, lambda: scrape_list_uncoalesced_async(list_type, username, use_cache, incremental, publish),
+        )
+    finally:
+        if on_page:
+            _page_listeners[key].remove(on_page)
+            if not _page_listeners[key]:
+                del _page_listeners[key]
+
+async def scrape_list_uncoalesced_async(list_type, username, use_cache, incremental, on_page=None):
+    """Scrape (or load) one list, calling on_page(page, last_page, rows) as each page is parsed.
+
+    A fresh cached snapshot is used as is, and an older one is synced incrementally; both
+    arrive as a single chunk. Raises ProfileNotFound when the list's first page can't be loaded. The DataFrame returned is also what gets cached, unless pages
+    failed after their retries: then it is returned but not cached, so the next call scrapes
+    it in full again instead of syncing incrementally on top of the gap.
+    """
+    columns = LIST_COLUMNS[list_type]
+    page_url = lambda page: list_page_url(list_type, username, page)
+
+    snapshot = await asyncio.to_thread(load_profile_snapshot, list_type, username) if use_cache else None
+    if snapshot is not None:
+        if time.time() - snapshot['fetched_at'] <= PROFILE_TTL:
+            if on_page:
+                on_page(1, 1, snapshot['rows'])
+            return await asyncio.to_thread(snapshot_frame, snapshot)
+        # Watchlists aren't ordered by when films were added, so they always get a full scrape
+        if incremental and list_type != 'watchlist' and time.time() - snapshot['full_synced_at'] <= FULL_SYNC_INTERVAL:
+            df = await sync_profile_incremental_async(snapshot, list_type, page_url)
+            if df is not None:
+                await asyncio.to_thread(store_cached_profile, list_type, username, df,
+                                        full_synced_at=snapshot['full_synced_at'])
+                if on_page:
+                    on_page(1, 1, await asyncio.to_thread(df.to_dict, orient='records'))
+                return df
+
+    rows, failed_pages = await scrape_pages_async(list_type, page_url, on_page)
+    if rows is None:
+        raise ProfileNotFound(username, list_type)
+
+    scraped_entries.inc(len(rows), list=list_type)
+    df = await asyncio.to_thread(pd.DataFrame, rows, columns=columns)
+    if failed_pages:
+        print(f"Failed to load {list_type} pages {failed_pages} for {username}; not caching the partial list")
+    elif use_cache:
+        await asyncio.to_thread(store_cached_profile, list_type, username, df)
+    return df
+
+
+async def scrape_films_async(username, use_cache=True, incremental=True):
+    return await scrape_list_async('films', username, use_cache, incremental)
+
+async def scrape_diary_async(username, use_cache=True, incremental=True, since=None):
+    """A user's diary; with since='YYYY/MM/DD', only the entries logged on or after that day.
+
+    A cached diary is synced and then cut to the window. Without one, pages are walked
+    newest-first and paging stops at the first page reaching back before the window.
+    """
+    if since is not None and not (use_cache and await asyncio.to_thread(load_profile_snapshot, 'diary', username)):
+        if not use_cache:
+            return await scrape_diary_window_async(username, since)
+        return await coalesce_async(('diary_window', username.lower(), since),
+                                    lambda: scrape_diary_window_async(username, since))
+    return diary_window(await scrape_list_async('diary', username, use_cache, incremental), since)
+
+async def scrape_diary_window_async(username, since):
+    """Walk a diary newest-first until a page reaches back before `since`. Not cached as a snapshot."""
+    columns = LIST_COLUMNS['diary']
+    rows = []
+    page = 1
+    while True:
+        response = await fetch_url_async(list_page_url('diary', username, page))
+        if not response:
+            if page == 1:
+                raise ProfileNotFound(username, 'diary')
+            break
+        page_rows, last_page = await parse_list_page('diary', response)
+        rows.extend(page_rows)
+        if not page_rows or page >= last_page or any(before_window(row['date'], since) for row in page_rows):
+            break
+        page += 1
+
+    scraped_entries.inc(len(rows), list='diary')
+    return diary_window(pd.DataFrame(rows, columns=columns), since)
+
+async def scrape_watchlist_async(username, use_cache=True):
+    return await scrape_list_async('watchlist', username, use_cache)
+
+async def scrape_profile_avatar_async(username):
+    response = await fetch_url_async(f"{DOMAIN}/{username}/", revalidate=False)
+    if not response:
+        print(f"Failed to load profile page for {username}")
+        return None
+    return await asyncio.to_thread(get_parser().profile_avatar, response.content)
+
+async def scrape_movie_poster_async(film_url):
+    response = await fetch_url_async(film_url, revalidate=False)
+    if not response:
+        raise RuntimeError("Error fetching poster: Failed to fetch page")
+    try:
+        return await asyncio.to_thread(get_parser().movie_poster, response.content)
+    except Exception as e:
+        raise RuntimeError(f"Error fetching poster: {e}")
@@ -0,0 +1,80 @@
+"""Check every parser backend against the BeautifulSoup reference on the saved fixtures, then time them.
+
+Usage (from the backend folder): python benchmarks/bench_parsers.py [repeats]
+Exits non-zero if any backend's output differs from the reference.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers import PARSERS, SoupParser, make_parser  # noqa: E402
+from pages import FIXTURES_DIR  # noqa: E402
+
+# Constants
+DEFAULT_REPEATS = 20
+# fixture file prefix -> how to parse it
+FIXTURE_KINDS = {
+    'films': lambda parser, content: parser.list_page('films', content),
+    'diary': lambda parser, content: parser.list_page('diary', content),
+    'watchlist': lambda parser, content: parser.list_page('watchlist', content),
+    'profile': lambda parser, content: parser.profile_avatar(content),
+    'film': lambda parser, content: parser.movie_poster(content),
+}
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    fixtures = []
+    for name in sorted(os.listdir(fixtures_dir)):
+        if not name.endswith('.html'):
+            continue
+        kind = name.split('_')[0].split('.')[0]
+        with open(os.path.join(fixtures_dir, name), 'rb') as f:
+            fixtures.append((name, FIXTURE_KINDS[kind], f.read()))
+    return fixtures
+
+def check_backend(parser, reference, fixtures):
+    """Return the names of fixtures where parser's output differs from the reference's."""
+    mismatches = []
+    for name, parse, content in fixtures:
+        if parse(parser, content) != parse(reference, content):
+            mismatches.append(name)
+    return mismatches
+
+def time_backend(parser, fixtures, repeats):
+    """Mean milliseconds per parse for each fixture."""
+    timings = {}
+    for name, parse, content in fixtures:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            parse(parser, content)
+        timings[name] = (time.perf_counter() - start) * 1000 / repeats
+    return timings
+
+def main(repeats=DEFAULT_REPEATS):
+    fixtures = load_fixtures()
+    reference = SoupParser()
+    # Skip backends that fell back to bs4 because their library isn't installed
+    parsers = list({parser.name: parser for parser in map(make_parser, PARSERS)}.values())
+
+    ok = True
+    for parser in parsers:
+        mismatches = check_backend(parser, reference, fixtures)
+        if mismatches:
+            ok = False
+            print(f"{parser.name}: output differs from bs4 on {', '.join(mismatches)}")
+        else:
+            print(f"{parser.name}: identical output on {len(fixtures)} fixtures")
+
+    timings = {parser.name: time_backend(parser, fixtures, repeats) for parser in parsers}
+    names = [parser.name for parser in parsers]
+    print(f"\n{'fixture':<28}" + ''.join(f"{name + ' ms':>12}" for name in names) + f"{'speedup':>10}")
+    for fixture_name, _, _ in fixtures:
+        row = [timings[name][fixture_name] for name in names]
+        print(f"{fixture_name:<28}" + ''.join(f"{ms:>12.2f}" for ms in row) + f"{row[0] / min(row):>9.1f}x")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEATS) else 1)
@@ -0,0 +1,153 @@
+"""Cold start and throughput of the gunicorn serving mode (gunicorn.conf.py and wsgi.py).
+
+For each worker count, starts gunicorn against the local Letterboxd stand-in, measures how
+long until /health first answers (cold start, including the preload), then how many warm
+requests per second concurrent clients get through, and writes a JSON report.
+
+Usage (from the backend folder):
+    python benchmarks/bench_serving.py [--workers 1 2 4] [--clients 16] [--seconds 10]
+                                       [--size 1000] [--endpoint blend|watchlist_party] [--out PATH]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+from standin import StandIn, make_catalog, make_user_pair, write_film_db  # noqa: E402
+
+# Constants
+DEFAULT_WORKERS = sorted({1, 2, os.cpu_count() or 1})
+STARTUP_TIMEOUT = 120
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(workers, workdir, standin_url):
+    """Start gunicorn and return (process, base URL, seconds until /health answered)."""
+    port = free_port()
+    env = dict(os.environ, BLEND_LETTERBOXD_URL=standin_url, BLEND_REQUESTS_PER_SECOND='1000000',
+               BLEND_REQUEST_BURST='1000000', BLEND_CACHE_PATH=os.path.join(workdir, 'blend_cache.sqlite3'),
+               BLEND_WEB_WORKERS=str(workers), BLEND_BIND=f"127.0.0.1:{port}")
+    log = open(os.path.join(workdir, f"gunicorn-{workers}.log"), 'w')
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+         '--pythonpath', BACKEND_DIR, 'wsgi:app'],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,  # the film DB path is relative
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    while time.perf_counter() - start < STARTUP_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}; see {log.name}")
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return process, base_url, time.perf_counter() - start
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.02)
+    process.terminate()
+    raise RuntimeError(f"gunicorn didn't answer within {STARTUP_TIMEOUT}s; see {log.name}")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def load(url, body, clients, seconds):
+    """POST body to url from `clients` threads for `seconds`; returns latencies and error count."""
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = session.post(url, json=body, timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            (latencies if ok else errors).append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gunicorn cold start and throughput per worker count.")
+    parser.add_argument('--workers', type=int, nargs='+', default=DEFAULT_WORKERS)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--size', type=int, default=1000, help="films per synthetic user")
+    parser.add_argument('--endpoint', choices=['blend', 'watchlist_party'], default='blend')
+    parser.add_argument('--out', default='benchmark_report_serving.json')
+    args = parser.parse_args()
+    out_path = os.path.abspath(args.out)
+
+    workdir = tempfile.mkdtemp(prefix='blend-serving-')
+    catalog = make_catalog(args.size * 4 + 1000)
+    write_film_db(catalog, os.path.join(workdir, 'mother22.csv'))
+    users = make_user_pair(catalog, args.size, seed=args.size)
+    standin = StandIn(users, catalog)
+    standin_url = standin.start()
+    standin.record()
+
+    user_a, user_b = users
+    path, body = {
+        'blend': ('/api/calculate_blend', {'username1': user_a, 'username2': user_b}),
+        'watchlist_party': ('/api/watchlist-party', {'usernames': [user_a, user_b]}),
+    }[args.endpoint]
+
+    results = []
+    for workers in args.workers:
+        process, base_url, cold_start_s = start_server(workers, workdir, standin_url)
+        try:
+            requests.post(base_url + path, json=body, timeout=300).raise_for_status()  # scrape into the shared cache
+            latencies, errors = load(base_url + path, body, args.clients, args.seconds)
+        finally:
+            stop_server(process)
+        latencies.sort()
+        result = {
+            'workers': workers,
+            'cold_start_s': cold_start_s,
+            'requests_per_s': len(latencies) / args.seconds,
+            'p50_ms': statistics.median(latencies) * 1000 if latencies else None,
+            'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+            'errors': errors,
+        }
+        results.append(result)
+        print(f"{workers:>3} workers  cold start {cold_start_s:6.2f}s  {result['requests_per_s']:8.1f} req/s"
+              f"  p50 {result['p50_ms'] or 0:7.1f} ms  p95 {result['p95_ms'] or 0:7.1f} ms  {errors} errors")
+
+    report = {
+        'meta': {'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'cpus': os.cpu_count(),
+                 'endpoint': args.endpoint, 'clients': args.clients, 'seconds': args.seconds, 'size': args.size},
+        'results': results,
+    }
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out_path}")
+    standin.stop()
+
+
+if __name__ == '__main__':
+    main()
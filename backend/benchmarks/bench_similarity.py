@@ -0,0 +1,152 @@
+"""The similarity core: one user blended against many, pandas merge path vs sorted film-id arrays.
+
+Builds synthetic users over a synthetic film database (a few of their films missing from the
+DB, as in real profiles), then checks that the pandas path the blend used to take, pairwise
+blend_profiles and the batched blend_one_vs_many give identical percentages, and times each.
+The pandas path is the original formula (Counters over the film DB's attribute strings and
+scipy's spearmanr), kept independent of profiles so it can catch the fast paths drifting.
+It needs scipy, which the server itself no longer does.
+
+Usage (from the backend folder):
+    python benchmarks/bench_similarity.py [--others 200] [--size 1000] [--repeats 5] [--out PATH]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+import pandas as pd  # noqa: E402
+from scipy.stats import spearmanr  # noqa: E402
+
+from standin import make_catalog, write_film_db  # noqa: E402
+
+# Constants
+RATINGS = [0.5 * i for i in range(1, 11)]
+UNRATED_SHARE = 0.15
+UNKNOWN_SHARE = 0.02
+
+
+def make_users(catalog, count, size, seed=0):
+    """count users' films frames (link, rating), drawn with a skew towards popular films."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 10) for rank in range(len(catalog))]
+    users = {}
+    for n in range(count):
+        picked = {film['slug'] for film in rng.choices(catalog, weights, k=size * 2)}
+        links = [f"/film/{slug}/" for slug in list(picked)[:size]]
+        links += [f"/film/not-in-db-{n}-{i}/" for i in range(int(size * UNKNOWN_SHARE))]
+        ratings = [None if rng.random() < UNRATED_SHARE else rng.choice(RATINGS) for _ in links]
+        users[f"user{n}"] = pd.DataFrame({'link': links, 'rating': ratings})
+    return users
+
+def jaccard(counter1, counter2):
+    intersection = sum((counter1 & counter2).values())
+    union = sum((counter1 | counter2).values())
+    return intersection / union if union > 0 else 0
+
+def attribute_counter(merged_df, attr):
+    """Counter of an attribute's comma-separated values over a user's films, as compare_attributes built it."""
+    return Counter(itertools.chain.from_iterable(merged_df[attr].dropna().str.split(', ')))
+
+def pandas_blend(df1, df2, local_db):
+    """The blend as calculate_blend_percentage computed it before profiles kept id arrays."""
+    from utils import BLEND_ATTRIBUTES, BLEND_WEIGHTS
+
+    merged1 = pd.merge(df1, local_db, on='link', how='left')
+    merged2 = pd.merge(df2, local_db, on='link', how='left')
+    total_weighted_jaccard = sum(
+        jaccard(attribute_counter(merged1, attr), attribute_counter(merged2, attr)) * weight
+        for attr, weight in zip(BLEND_ATTRIBUTES, BLEND_WEIGHTS)
+    )
+    total_weighted_jaccard = min(total_weighted_jaccard / sum(BLEND_WEIGHTS), 1)
+
+    merged_df = pd.merge(df1, df2, on='link')
+    total_movies = len(set(df1['link']).union(set(df2['link'])))
+    proportion_common = min(len(merged_df) / total_movies if total_movies > 0 else 0, 1)
+    rated = merged_df.dropna(subset=['rating_x', 'rating_y'])
+    if len(rated) > 1:
+        corr = spearmanr(rated['rating_x'], rated['rating_y']).correlation
+        spearman_normalized = min((corr + 1) / 2, 1)
+    else:
+        spearman_normalized = 0
+    return round(min((0.2 * proportion_common) + (0.9 * spearman_normalized) + (0.15 * total_weighted_jaccard), 1) * 100)
+
+def or_none(blend, *args):
+    """blend(*args), or None where it fails on an undefined rank correlation (as blend_one_vs_many reports it)."""
+    try:
+        return blend(*args)
+    except ValueError:
+        return None
+
+def median_time(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare and time the pandas and array similarity paths.")
+    parser.add_argument('--others', type=int, default=200, help="users blended against the first one")
+    parser.add_argument('--size', type=int, default=1000, help="films per synthetic user")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--out', default='benchmark_report_similarity.json')
+    args = parser.parse_args()
+    out_path = os.path.abspath(args.out)
+
+    workdir = tempfile.mkdtemp(prefix='blend-similarity-')
+    catalog = make_catalog(args.size * 10)
+    write_film_db(catalog, os.path.join(workdir, 'mother22.csv'))
+    os.chdir(workdir)  # the film DB path is relative
+
+    from profiles import UserProfile, blend_one_vs_many, blend_profiles
+
+    frames = make_users(catalog, args.others + 1, args.size)
+    names = list(frames)
+    profiles, build_s = median_time(lambda: [UserProfile(name, frames[name]) for name in names], 1)
+    first, others = profiles[0], profiles[1:]
+    df_first = frames[names[0]]
+    local_db = pd.read_csv('mother22.csv')
+
+    reference, pandas_s = median_time(
+        lambda: [or_none(pandas_blend, df_first, frames[other.username], local_db) for other in others],
+        args.repeats)
+    pairwise, pairwise_s = median_time(lambda: [or_none(blend_profiles, first, other) for other in others],
+                                       args.repeats)
+    batched, batched_s = median_time(lambda: blend_one_vs_many(first, others), args.repeats)
+    mismatches = sum(a != b or a != c for a, b, c in zip(reference, pairwise, batched))
+
+    report = {
+        'meta': {'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'others': args.others,
+                 'size': args.size, 'repeats': args.repeats},
+        'profile_build_s': build_s,
+        'pandas_merge_s': pandas_s,
+        'blend_profiles_s': pairwise_s,
+        'blend_one_vs_many_s': batched_s,
+        'mismatches': mismatches,
+    }
+    print(f"profile build:      {build_s * 1000:8.1f} ms for {len(profiles)} users")
+    print(f"pandas merge:       {pandas_s * 1000:8.1f} ms")
+    print(f"blend_profiles:     {pairwise_s * 1000:8.1f} ms  ({pandas_s / pairwise_s:.1f}x)")
+    print(f"blend_one_vs_many:  {batched_s * 1000:8.1f} ms  ({pandas_s / batched_s:.1f}x)")
+    print(f"mismatches:         {mismatches} of {len(others)}")
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out_path}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Startup cost of the backend: how long `import app` takes and how soon /health first answers.
+
+Each measurement runs in a fresh interpreter, as a new worker would. Also lists which heavy
+libraries `import app` loaded (ideally none: they are imported on first use).
+
+Usage (from the backend folder):
+    python benchmarks/bench_startup.py [--repeats 5] [--out PATH]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+# Constants
+HEAVY_MODULES = ['pandas', 'numpy', 'scipy', 'bs4', 'lxml', 'requests', 'httpx']
+STARTUP_TIMEOUT = 60
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import app
+print(json.dumps({'seconds': time.perf_counter() - start,
+                  'loaded': [name for name in %r if name in sys.modules]}))
+""" % HEAVY_MODULES
+
+SERVE_SNIPPET = """
+import sys
+from werkzeug.serving import make_server
+import app
+make_server('127.0.0.1', int(sys.argv[1]), app.app, threaded=True).serve_forever()
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def measure_import():
+    output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=BACKEND_DIR, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure_first_health():
+    """Seconds from starting a server process until GET /health returns 200."""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', SERVE_SNIPPET, str(port)], cwd=BACKEND_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < STARTUP_TIMEOUT:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"/health didn't answer within {STARTUP_TIMEOUT}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first /health response.")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--out', default='benchmark_report_startup.json')
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.repeats)]
+    first_health = [measure_first_health() for _ in range(args.repeats)]
+    report = {
+        'meta': {'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'repeats': args.repeats,
+                 'python': sys.version.split()[0]},
+        'import_app_median_s': statistics.median(run['seconds'] for run in imports),
+        'first_health_median_s': statistics.median(first_health),
+        'heavy_modules_loaded_by_import': imports[0]['loaded'],
+        'runs': {'import_app_s': [run['seconds'] for run in imports], 'first_health_s': first_health},
+    }
+    print(f"import app:         {report['import_app_median_s'] * 1000:8.1f} ms (median of {args.repeats})")
+    print(f"first /health:      {report['first_health_median_s'] * 1000:8.1f} ms")
+    print(f"heavy modules:      {', '.join(report['heavy_modules_loaded_by_import']) or 'none'}")
+    with open(os.path.abspath(args.out), 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {os.path.abspath(args.out)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""Render Letterboxd-shaped HTML pages for parser fixtures and benchmarks.
+
+The markup follows the structure of real films, diary, watchlist, profile and film pages
+(poster lists, diary rows, pagination, JSON-LD), with the usual page chrome around it so
+parse timings are representative. Run `python benchmarks/pages.py` to regenerate fixtures/.
+"""
+import json
+import os
+import random
+import sys
+from html import escape
+
+# Constants
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FILMS_PER_PAGE = 72
+DIARY_PER_PAGE = 50
+STARS = ['½', '★', '★½', '★★', '★★½', '★★★', '★★★½', '★★★★', '★★★★½', '★★★★★']
+TITLES = ['Parasite', 'Mulholland Drive', 'In the Mood for Love', 'Amélie', 'Léon: The Professional',
+          'Crouching Tiger, Hidden Dragon', 'Spider-Man: Into the Spider-Verse', 'Portrait of a Lady on Fire',
+          '8½', 'Fast & Furious', 'The Good, the Bad and the Ugly', '"Wonderful" Life', 'Seven Samurai',
+          'Y tu mamá también', '2001: A Space Odyssey', 'Paris, Texas', 'Eternal Sunshine of the Spotless Mind']
+
+HEAD = """<!DOCTYPE html>
+<html lang="en" class="no-js">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title} &bull; Letterboxd</title>
+<link rel="stylesheet" href="https://s.ltrbxd.com/static/css/main.css">
+<script src="https://s.ltrbxd.com/static/js/main.min.js"></script>
+<script>var person = {{ loggedIn: false, username: "" }}; var filmData = {{}};</script>
+{extra_head}
+</head>
+<body class="{body_class}">
+<header class="site-header js-hide-in-app" id="header">
+<section><h1 class="site-logo"><a href="/" class="logo replace">Letterboxd</a></h1>
+<div class="react-component" data-component-class="GlobalNavigation"></div>
+<nav class="main-nav"><ul class="navitems">
+<li class="main-nav-signin"><a href="/sign-in/">Sign in</a></li>
+<li class="main-nav-films"><a href="/films/">Films</a></li>
+<li class="main-nav-lists"><a href="/lists/">Lists</a></li>
+<li class="main-nav-people"><a href="/members/">Members</a></li>
+<li class="main-nav-journal"><a href="/journal/">Journal</a></li>
+</ul></nav></section>
+</header>
+<div id="content" class="site-body">
+<div class="content-wrap">
+"""
+
+FOOTER = """</div>
+</div>
+<footer id="page-footer"><div class="content-wrap">
+<nav class="footer-nav"><ul>
+<li><a href="/about/">About</a></li><li><a href="/pro/">Pro</a></li><li><a href="/news/">News</a></li>
+<li><a href="/apps/">Apps</a></li><li><a href="/contact/">Contact</a></li><li><a href="/legal/">Terms</a></li>
+</ul></nav>
+<p class="copyright">&copy; Letterboxd Limited. Made by <a href="/crew/">fans</a> in Aotearoa New Zealand.</p>
+</div></footer>
+</body>
+</html>
+"""
+
+
+def synthetic_films(n, seed=0):
+    """n distinct films with deterministic ids, slugs, titles, ratings, likes and diary dates."""
+    rng = random.Random(seed)
+    films = []
+    for i in range(n):
+        film_id = 1000 + i * 7 + rng.randrange(7)
+        title = f"{rng.choice(TITLES)} {i}" if i >= len(TITLES) else TITLES[i]
+        rated = rng.random() < 0.85
+        films.append({
+            'id': str(film_id),
+            'slug': f"film-{film_id}",
+            'title': title,
+            'rating': rng.randrange(len(STARS)) if rated else None,
+            'liked': rng.random() < 0.2,
+            'date': f"{rng.randrange(2015, 2025)}/{rng.randrange(1, 13):02d}/{rng.randrange(1, 29):02d}",
+        })
+    return films
+
+def page(title, body, body_class='', extra_head=''):
+    return HEAD.format(title=escape(title), body_class=body_class, extra_head=extra_head) + body + FOOTER
+
+def pagination(base_path, current, last_page):
+    if last_page <= 1:
+        return ''
+    items = []
+    previous = None
+    for number in sorted({1, 2, current - 1, current, current + 1, last_page - 1, last_page}):
+        if not 1 <= number <= last_page:
+            continue
+        if previous is not None and number - previous > 1:
+            items.append('<li class="paginate-page unseen-pages">&hellip;</li>')
+        href = base_path if number == 1 else f"{base_path}page/{number}/"
+        if number == current:
+            items.append(f'<li class="paginate-page paginate-current"><span>{number}</span></li>')
+        else:
+            items.append(f'<li class="paginate-page"><a href="{href}">{number}</a></li>')
+        previous = number
+    return ('<div class="pagination"><div class="paginate-pages"><ul>'
+            + ''.join(items) + '</ul></div></div>\n')
+
+def poster_div(film):
+    return (f'<div class="really-lazy-load poster film-poster film-poster-{film["id"]} linked-film-poster" '
+            f'data-image-width="70" data-image-height="105" data-film-id="{film["id"]}" '
+            f'data-film-slug="{film["slug"]}" data-poster-url="/film/{film["slug"]}/image-150/" '
+            f'data-linked="linked" data-target-link="/film/{film["slug"]}/" data-target-link-target="" '
+            f'data-cache-busting-key="a1b2c3d4" data-show-menu="true">\n'
+            f'<img src="https://s.ltrbxd.com/static/img/empty-poster-70.png" class="image" width="70" '
+            f'height="105" alt="{escape(film["title"])}" />\n'
+            f'<span class="frame"><span class="frame-title"></span></span>\n</div>\n')
+
+def films_page(username, films, current=1, last_page=1):
+    items = []
+    for film in films:
+        rating = '' if film['rating'] is None else (
+            f'<span class="rating -micro -darker rated-{film["rating"] + 1}"> {STARS[film["rating"]]} </span>')
+        like = '<span class="like liked-micro has-icon icon-liked icon-16"><span class="icon"></span></span>' if film['liked'] else ''
+        items.append(f'<li class="poster-container">\n{poster_div(film)}'
+                     f'<p class="poster-viewingdata" data-item-uid="film:{film["id"]}">\n{rating}\n{like}\n</p>\n</li>\n')
+    body = ('<section class="section col-main"><div id="content-nav"><h2>Films</h2></div>\n'
+            '<ul class="poster-list -p70 -grid film-list clear">\n' + ''.join(items) + '</ul>\n'
+            + pagination(f"/{username}/films/", current, last_page) + '</section>\n')
+    return page(f"{username}'s films", body, 'films-watched')
+
+def watchlist_page(username, films, current=1, last_page=1):
+    items = [f'<li class="poster-container">\n{poster_div(film)}</li>\n' for film in films]
+    body = ('<section class="section col-main"><h1 class="title-3">Want to watch</h1>\n'
+            '<ul class="poster-list -p125 -grid -scaled128">\n' + ''.join(items) + '</ul>\n'
+            + pagination(f"/{username}/watchlist/", current, last_page) + '</section>\n')
+    return page(f"{username}'s watchlist", body, 'watchlist')
+
+def diary_page(username, films, current=1, last_page=1):
+    rows = []
+    for n, film in enumerate(films):
+        year, month, day = film['date'].split('/')
+        rating = '' if film['rating'] is None else (
+            f'<span class="rating rated-{film["rating"] + 1}"> {STARS[film["rating"]]} </span>')
+        like = '<span class="has-icon icon-16 large-liked"></span>' if film['liked'] else ''
+        rows.append(
+            f'<tr class="diary-entry-row viewing-poster-container" data-viewing-id="{9000 + n}" '
+            f'data-owner="{username}" data-object-id="viewing:{film["id"]}">\n'
+            f'<td class="td-calendar"><div class="date"><a href="/{username}/films/diary/for/{year}/{month}/" class="month">{month}</a></div></td>\n'
+            f'<td class="td-day diary-day center"><a href="/{username}/films/diary/for/{year}/{month}/{day}/">{day}</a></td>\n'
+            f'<td class="td-film-details"><div class="film-poster"><img alt="{escape(film["title"])}" /></div>\n'
+            f'<h3 class="headline-3 prettify"><a href="/{username}/film/{film["slug"]}/"> {escape(film["title"])} </a></h3></td>\n'
+            f'<td class="td-released center"><span>{year}</span></td>\n'
+            f'<td class="td-rating rating-green"><div class="hide-for-owner"><div class="rating-green rating-green-tiny">{rating}</div></div></td>\n'
+            f'<td class="td-like center diary-like">{like}</td>\n'
+            f'<td class="td-rewatch center icon-status-off"><span class="has-icon icon-rewatch icon-16"></span></td>\n'
+            f'<td class="td-actions film-actions has-menu hide-when-logged-out" data-film-id="{film["id"]}" '
+            f'data-film-name="{escape(film["title"])}" data-film-link="/film/{film["slug"]}/" data-film-release-year="{year}"></td>\n'
+            '</tr>\n')
+    body = ('<section class="section col-main"><table class="table film-table" id="diary-table">\n'
+            '<thead><tr><th>Month</th><th>Day</th><th>Film</th><th>Released</th><th>Rating</th><th>Like</th>'
+            '<th>Rewatch</th><th>Review</th><th>Edit</th></tr></thead>\n<tbody>\n' + ''.join(rows)
+            + '</tbody></table>\n' + pagination(f"/{username}/films/diary/", current, last_page) + '</section>\n')
+    return page(f"{username}'s diary", body, 'diary')
+
+def profile_page(username, avatar_url):
+    body = (f'<section class="profile-header js-profile-header" data-person="{username}">\n'
+            f'<div class="profile-summary js-profile-summary"><div class="profile-avatar">\n'
+            f'<span class="avatar -a500 -borderless -large"><img src="{avatar_url}" alt="{username}" width="500" height="500" /></span>\n'
+            f'</div><div class="profile-info"><h1 class="title-1">{username}</h1></div></div>\n'
+            '<div class="profile-stats js-profile-stats"><h4 class="profile-statistic statistic"><a href="films/">'
+            '<span class="value">1,234</span><span class="definition">Films</span></a></h4></div>\n</section>\n')
+    return page(f"{username}'s profile", body, 'profile')
+
+def film_page(film, poster_url):
+    json_ld = json.dumps({
+        'image': poster_url, '@type': 'Movie', 'name': film['title'],
+        'url': f"https://letterboxd.com/film/{film['slug']}/", '@context': 'http://schema.org',
+        'aggregateRating': {'bestRating': 5, 'ratingValue': 4.1, '@type': 'aggregateRating', 'ratingCount': 12345},
+    })
+    extra_head = ('<script type="application/ld+json">\n/* <![CDATA[ */\n' + json_ld + '\n/* ]]> */\n</script>')
+    body = (f'<div id="film-page-wrapper"><section class="film-header-group"><h1 class="headline-1 filmtitle">'
+            f'<span class="name">{escape(film["title"])}</span></h1></section>\n'
+            '<section class="production-synopsis"><div class="truncate"><p>A film.</p></div></section></div>\n')
+    return page(film['title'], body, 'film', extra_head)
+
+def write_fixtures(out_dir=FIXTURES_DIR):
+    """Write the saved pages benchmarks/bench_parsers.py compares parser backends on."""
+    os.makedirs(out_dir, exist_ok=True)
+    films = synthetic_films(200, seed=12)
+    # A poster without viewing data (skipped by the films parser) and an unrated, liked one
+    films_html = films_page('fixture', films[:FILMS_PER_PAGE], 1, 3).replace(
+        '<p class="poster-viewingdata" data-item-uid="film:%s">' % films[5]['id'], '<p class="poster-note">', 1)
+    # A diary row whose day cell has no link (date becomes "Unknown")
+    year, month, day = films[3]['date'].split('/')
+    diary_html = diary_page('fixture', films[:DIARY_PER_PAGE], 1, 4).replace(
+        f'<a href="/fixture/films/diary/for/{year}/{month}/{day}/">{day}</a>', day, 1)
+    fixtures = {
+        'films_page1.html': films_html,
+        'films_page3.html': films_page('fixture', films[2 * FILMS_PER_PAGE:], 3, 3),
+        'films_single_page.html': films_page('fixture', films[:10]),
+        'diary_page1.html': diary_html,
+        'watchlist_page1.html': watchlist_page('fixture', films[:FILMS_PER_PAGE], 1, 2),
+        'watchlist_empty.html': page("fixture's watchlist", '<section class="section col-main"><p>Empty.</p></section>\n'),
+        'profile.html': profile_page('fixture', 'https://a.ltrbxd.com/resized/avatar/upload/1/2/3/4/shard/avtr-0-1000-0-1000-crop.jpg'),
+        'profile_default_avatar.html': profile_page('fixture', '/static/img/avatar500.png'),
+        'film.html': film_page(films[0], 'https://a.ltrbxd.com/resized/film-poster/4/2/6/4/0/6/426406-parasite-0-230-0-345-crop.jpg'),
+    }
+    for name, html in fixtures.items():
+        with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+            f.write(html)
+    return sorted(fixtures)
+
+
+if __name__ == '__main__':
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else FIXTURES_DIR
+    for name in write_fixtures(out_dir):
+        print(f"Wrote {os.path.join(out_dir, name)}")
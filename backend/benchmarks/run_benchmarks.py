@@ -0,0 +1,225 @@
+"""End-to-end benchmarks of the scrapers, blend, top common films and watchlist party.
+
+Runs against the local Letterboxd stand-in (benchmarks/standin.py) with synthetic user pairs
+of each size and a synthetic film database, and writes a JSON report to compare across commits.
+
+Usage (from the backend folder):
+    python benchmarks/run_benchmarks.py [--sizes 100 1000 10000] [--repeats 3] [--out PATH]
+                                        [--cache sqlite|memory] [--requests-per-second N]
+
+Every benchmark runs "cold" (empty page/profile caches, as for a first visit) and "warm"
+(straight after, as for a repeat visit). Stage times are inclusive and summed over threads,
+so concurrent fetches can add up to more than the wall time.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from standin import StandIn, make_catalog, make_user_pair, write_film_db  # noqa: E402
+
+# Constants
+DEFAULT_SIZES = [100, 1000, 10000]
+DEFAULT_REPEATS = 3
+UNLIMITED_RATE = 1e6
+
+
+class StageTimer:
+    """Accumulates time spent inside wrapped functions, per stage name, across threads."""
+
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.totals)
+
+    def wrap(self, stage, fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.add(stage, time.perf_counter() - start)
+            return timed_async
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def instrument(self, owner, name, stage):
+        setattr(owner, name, self.wrap(stage, getattr(owner, name)))
+
+def instrument_stages(timer):
+    """Wrap the functions that make up each stage of a request."""
+    import async_scraper
+    import cache
+    import parsers
+    import profiles
+    import utils
+
+    timer.instrument(async_scraper, 'fetch_url_async', 'fetch')
+    for parser_class in parsers.PARSERS.values():
+        for method in ('list_page', 'profile_avatar', 'movie_poster'):
+            timer.instrument(parser_class, method, 'parse')
+    for cache_class in (cache.MemoryCache, cache.SQLiteCache):
+        for method in ('get', 'set'):
+            timer.instrument(cache_class, method, 'cache')
+    timer.instrument(utils, 'join_film_db', 'film_db_join')
+    timer.instrument(profiles.UserProfile, '__init__', 'profile_build')
+    timer.instrument(profiles, 'blend_profiles', 'similarity')
+    timer.instrument(utils, 'intersect_watchlists', 'intersect')
+    timer.instrument(utils, 'filter_common_movies', 'filter')
+
+def reset_state():
+    """Forget every scraped page, list snapshot and in-process profile, as after a deploy."""
+    import cache
+    import profiles
+
+    cache.get_cache().clear()
+    with profiles._profiles_lock:
+        profiles._profiles.clear()
+
+def benchmark_cases(user_a, user_b):
+    import utils
+
+    return [
+        ('scrape_films', lambda: utils.scrape_films(user_a)),
+        ('scrape_diary', lambda: utils.scrape_diary(user_a)),
+        ('scrape_watchlist', lambda: utils.scrape_watchlist(user_a)),
+        ('calculate_blend_percentage', lambda: utils.calculate_blend_percentage(user_a, user_b)),
+        ('find_top_rated_common_films', lambda: utils.find_top_rated_common_films(user_a, user_b)),
+        ('get_watchlist_party_results', lambda: utils.get_watchlist_party_results([user_a, user_b])),
+    ]
+
+def run_case(fn, standin, timer):
+    stages_before = timer.snapshot()
+    requests_before = standin.requests
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    stages = {stage: total - stages_before.get(stage, 0.0) for stage, total in timer.snapshot().items()}
+    return {'seconds': seconds, 'requests': standin.requests - requests_before,
+            'stages': {stage: value for stage, value in stages.items() if value > 0}}
+
+def summarize(runs):
+    stage_names = sorted({stage for run in runs for stage in run['stages']})
+    return {
+        'median_s': statistics.median(run['seconds'] for run in runs),
+        'min_s': min(run['seconds'] for run in runs),
+        'requests': statistics.median(run['requests'] for run in runs),
+        'stages_median_s': {stage: statistics.median(run['stages'].get(stage, 0.0) for run in runs)
+                            for stage in stage_names},
+        'runs': runs,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend against a local Letterboxd stand-in.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="films per synthetic user")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    parser.add_argument('--out', default='benchmark_report.json')
+    parser.add_argument('--cache', choices=['sqlite', 'memory'], default='sqlite')
+    parser.add_argument('--requests-per-second', type=float, default=UNLIMITED_RATE,
+                        help="per-host scrape rate limit (unlimited by default, to time our code)")
+    args = parser.parse_args()
+    out_path = os.path.abspath(args.out)
+
+    workdir = tempfile.mkdtemp(prefix='blend-bench-')
+    catalog = make_catalog(max(args.sizes) * 4 + 1000)
+    write_film_db(catalog, os.path.join(workdir, 'mother22.csv'))
+    users = {}
+    for size in args.sizes:
+        users.update(make_user_pair(catalog, size, seed=size))
+    standin = StandIn(users, catalog)
+    base_url = standin.start()
+    standin.record()
+
+    # The backend reads these at import time
+    os.environ['BLEND_LETTERBOXD_URL'] = base_url
+    os.environ['BLEND_REQUESTS_PER_SECOND'] = str(args.requests_per_second)
+    os.environ['BLEND_REQUEST_BURST'] = str(int(max(args.requests_per_second, 1)))
+    os.environ['BLEND_CACHE_BACKEND'] = args.cache
+    os.environ['BLEND_CACHE_PATH'] = os.path.join(workdir, 'blend_cache.sqlite3')
+    os.chdir(workdir)  # the film DB path is relative
+
+    import film_db
+    import parsers
+    import utils
+
+    start = time.perf_counter()
+    film_db.get_film_db()
+    film_db.get_attribute_index(utils.BLEND_ATTRIBUTES)
+    film_db.get_filter_index()
+    film_db_load_s = time.perf_counter() - start
+
+    timer = StageTimer()
+    instrument_stages(timer)
+
+    results = []
+    for size in args.sizes:
+        for name, fn in benchmark_cases(f"bench{size}a", f"bench{size}b"):
+            for mode in ('cold', 'warm'):
+                runs = []
+                for _ in range(args.repeats):
+                    if mode == 'cold':
+                        reset_state()
+                    runs.append(run_case(fn, standin, timer))
+                summary = summarize(runs)
+                results.append(dict(size=size, benchmark=name, mode=mode, **summary))
+                print(f"{size:>6} {name:<30} {mode:<5} {summary['median_s'] * 1000:>10.1f} ms"
+                      f" {summary['requests']:>6.0f} requests")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parser': parsers.get_parser().name,
+            'cache': args.cache,
+            'requests_per_second': args.requests_per_second,
+            'repeats': args.repeats,
+            'film_db_rows': len(catalog),
+            'film_db_load_s': film_db_load_s,
+        },
+        'results': results,
+    }
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out_path}")
+    standin.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""A local stand-in for Letterboxd: synthetic users and films served over HTTP on localhost.
+
+Pages are rendered once with benchmarks/pages.py and then served as recorded bytes, so a
+benchmark measures our scraping and not the renderer. Point the backend at it with the
+BLEND_LETTERBOXD_URL environment variable (before importing utils).
+"""
+import csv
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pages import (
+    FILMS_PER_PAGE, DIARY_PER_PAGE, STARS, TITLES, diary_page, film_page, films_page, page, profile_page,
+    watchlist_page,
+)
+
+# Constants
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family', 'Fantasy',
+          'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
+COUNTRIES = ['USA', 'UK', 'France', 'Japan', 'South Korea', 'Italy', 'Germany', 'India']
+LANGUAGES = ['English', 'French', 'Japanese', 'Korean', 'Italian', 'German', 'Hindi']
+PEOPLE = [f"Person {i}" for i in range(3000)]
+FILM_DB_COLUMNS = ['link', 'title', 'year', 'avg_rating', 'decade', 'directors', 'genres', 'themes', 'studios',
+                   'countries', 'language', 'cinematographer', 'composers', 'cast', 'popularity_class',
+                   'duration_class', 'runtime']
+LIST_URL = re.compile(r'^/([\w-]+)/(films/diary|films/by/entry-rating|films|watchlist)/(?:page/(\d+)/)?$')
+LIST_TYPES = {'films': 'films', 'films/diary': 'diary', 'films/by/entry-rating': 'films', 'watchlist': 'watchlist'}
+PROFILE_URL = re.compile(r'^/([\w-]+)/$')
+FILM_URL = re.compile(r'^/film/([\w-]+)/$')
+
+
+def make_catalog(n, seed=0):
+    """n films with ids, slugs and titles; the pool synthetic users draw from."""
+    rng = random.Random(seed)
+    return [
+        {'id': str(100000 + i), 'slug': f"film-{100000 + i}",
+         'title': f"{rng.choice(TITLES)} {i}" if i >= len(TITLES) else TITLES[i]}
+        for i in range(n)
+    ]
+
+def write_film_db(catalog, path, seed=0):
+    """Write a film database CSV in mother22.csv's format covering every catalog film."""
+    rng = random.Random(seed)
+    pick = lambda pool, k: str(rng.sample(pool, k))
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(FILM_DB_COLUMNS)
+        for film in catalog:
+            year = rng.randrange(1920, 2025)
+            runtime = rng.randrange(70, 200) if rng.random() < 0.95 else ''
+            writer.writerow([
+                f"/film/{film['slug']}/", film['title'], year, round(rng.uniform(1, 5), 2), f"{year // 10 * 10}s",
+                pick(PEOPLE[:400], rng.randint(1, 2)), pick(GENRES, rng.randint(1, 3)),
+                pick([f"Theme {j}" for j in range(80)], 3), pick([f"Studio {j}" for j in range(60)], 2),
+                pick(COUNTRIES, 1), rng.choice(LANGUAGES), rng.choice(PEOPLE[400:500]), rng.choice(PEOPLE[500:600]),
+                pick(PEOPLE[600:], rng.randint(3, 8)), rng.choice(['popular', 'niche', 'obscure']),
+                rng.choice(['short', 'medium', 'long']), runtime,
+            ])
+    return path
+
+def random_date(rng):
+    return f"{rng.randrange(2015, 2025)}/{rng.randrange(1, 13):02d}/{rng.randrange(1, 29):02d}"
+
+def make_user_pair(catalog, size, seed=0, overlap=0.5):
+    """Two users with `size` films each (sharing about `overlap` of them), diaries and watchlists.
+
+    Part of the shared films are logged on the same date by both, as for a joint viewing.
+    Returns {username: {'films': [...], 'diary': [...], 'watchlist': [...]}}.
+    """
+    rng = random.Random(seed)
+    shared = rng.sample(catalog, int(size * overlap))
+    shared_ids = {film['id'] for film in shared}
+    rest = [film for film in catalog if film['id'] not in shared_ids]
+    rng.shuffle(rest)
+    users = {}
+    for n, name in enumerate(('a', 'b')):
+        own = rest[n * size:(n + 1) * size - len(shared)]
+        films = [dict(film, rating=rng.randrange(len(STARS)) if rng.random() < 0.85 else None,
+                      liked=rng.random() < 0.2) for film in shared + own]
+        rng.shuffle(films)
+        watched = {film['id'] for film in films}
+        unwatched = [film for film in rest[2 * size:] if film['id'] not in watched]
+        watchlist = rng.sample(shared, min(len(shared), size // 4)) + rng.sample(unwatched, min(len(unwatched), size // 2))
+        rng.shuffle(watchlist)
+        users[f"bench{size}{name}"] = {'films': films, 'watchlist': watchlist}
+
+    # A slice of the shared films was watched together, so both diaries log them on the same date
+    joint_dates = {film['id']: random_date(rng) for film in rng.sample(shared, len(shared) // 3)}
+    for user in users.values():
+        diary = [dict(film, date=joint_dates.get(film['id']) or random_date(rng)) for film in user['films']]
+        user['diary'] = sorted(diary, key=lambda film: film['date'], reverse=True)
+    return users
+
+
+class StandIn:
+    """Serves users' films/diary/watchlist pages, profile pages and film pages from memory."""
+
+    def __init__(self, users, catalog):
+        self.users = users
+        self.films = {film['slug']: film for film in catalog}
+        self.recorded = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = None
+
+    def render(self, path):
+        match = LIST_URL.match(path)
+        if match:
+            username, list_path, page_number = match.group(1), match.group(2), int(match.group(3) or 1)
+            user = self.users.get(username)
+            if user is None:
+                return None
+            list_type = LIST_TYPES[list_path]
+            per_page = DIARY_PER_PAGE if list_type == 'diary' else FILMS_PER_PAGE
+            entries = user[list_type]
+            if list_path == 'films/by/entry-rating':  # highest rated first, unrated films last
+                entries = sorted(entries, key=lambda film: -1 if film['rating'] is None else film['rating'], reverse=True)
+            last_page = max(1, -(-len(entries) // per_page))
+            chunk = entries[(page_number - 1) * per_page:page_number * per_page]
+            render = {'films': films_page, 'diary': diary_page, 'watchlist': watchlist_page}[list_type]
+            return render(username, chunk, page_number, last_page)
+        match = FILM_URL.match(path)
+        if match:
+            film = self.films.get(match.group(1))
+            if film is None:
+                return None
+            return film_page(film, f"https://a.ltrbxd.com/resized/film-poster/{film['id']}-0-230-0-345-crop.jpg")
+        match = PROFILE_URL.match(path)
+        if match and match.group(1) in self.users:
+            return profile_page(match.group(1), f"https://a.ltrbxd.com/resized/avatar/{match.group(1)}-0-500-0-500-crop.jpg")
+        return None
+
+    def record(self):
+        """Render every list and profile page up front so no timed request pays for rendering."""
+        for username, user in self.users.items():
+            for list_path, list_type in LIST_TYPES.items():
+                per_page = DIARY_PER_PAGE if list_type == 'diary' else FILMS_PER_PAGE
+                last_page = max(1, -(-len(user[list_type]) // per_page))
+                for page_number in range(1, last_page + 1):
+                    suffix = '' if page_number == 1 else f"page/{page_number}/"
+                    self.respond(f"/{username}/{list_path}/{suffix}")
+            self.respond(f"/{username}/")
+        self.requests = 0
+
+    def respond(self, path):
+        """Recorded bytes for path (rendered on first request), or None for a 404."""
+        with self._lock:
+            self.requests += 1
+            if path not in self.recorded:
+                html = self.render(path)
+                self.recorded[path] = html.encode('utf-8') if html is not None else None
+            return self.recorded[path]
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve on a background thread and return the base URL."""
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = standin.respond(self.path)
+                if body is None:
+                    body = page('Not found', '<p>Sorry, we can’t find the page you’ve requested.</p>').encode('utf-8')
+                    self.send_response(404)
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='standin', daemon=True).start()
+        return f"http://{host}:{self.server.server_port}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
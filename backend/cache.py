@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import cache_lookups
+
+# Constants
+CACHE_BACKEND = os.environ.get('BLEND_CACHE_BACKEND', 'sqlite')
+CACHE_DB_PATH = os.environ.get('BLEND_CACHE_PATH', 'blend_cache.sqlite3')
+CACHE_MAX_ENTRIES = int(os.environ.get('BLEND_CACHE_MAX_ENTRIES', 20000))
+CACHE_MAX_BYTES = int(os.environ.get('BLEND_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # stored JSON, page bodies included
+TOUCH_RESOLUTION = 60  # seconds; a read doesn't refresh an accessed_at newer than this
+TOUCH_BATCH_SIZE = 100
+TOUCH_INTERVAL = 5  # seconds between batched accessed_at writes
+PROFILE_TTL = int(os.environ.get('BLEND_PROFILE_TTL', 6 * 60 * 60))  # scraped lists
+SNAPSHOT_TTL = int(os.environ.get('BLEND_SNAPSHOT_TTL', 30 * 24 * 60 * 60))  # kept for incremental sync
+FULL_SYNC_INTERVAL = int(os.environ.get('BLEND_FULL_SYNC_INTERVAL', 7 * 24 * 60 * 60))  # drops deletions/old edits
+PAGE_TTL = int(os.environ.get('BLEND_PAGE_TTL', 7 * 24 * 60 * 60))  # page bodies kept for revalidation
+POSTER_TTL = int(os.environ.get('BLEND_POSTER_TTL', 90 * 24 * 60 * 60))  # film link -> poster URL
+AVATAR_TTL = int(os.environ.get('BLEND_AVATAR_TTL', 7 * 24 * 60 * 60))  # username -> avatar URL
+IMAGE_MISS_TTL = int(os.environ.get('BLEND_IMAGE_MISS_TTL', 60 * 60))  # failed poster/avatar lookups
+
+
+def record_lookup(key, value):
+    """Count a lookup as a hit or miss under its key's kind (the part before the first ':')."""
+    cache_lookups.inc(kind=key.split(':', 1)[0], result='miss' if value is None else 'hit')
+    return value
+
+
+class MemoryCache:
+    """In-process LRU cache with per-entry TTL. Used for tests and single-worker runs."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, include_stale=False):
+        """Return the cached value for key, or None if missing or expired."""
+        return record_lookup(key, self._get(key, include_stale))
+
+    def _get(self, key, include_stale):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time() and not include_stale:
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """On-disk cache shared by every worker on the host. Values are stored as JSON.
+
+    Bounded both by entry count and by the bytes of stored JSON, since page entries carry whole
+    HTML bodies. Reads don't write: accessed_at (the LRU order) is refreshed at most once per
+    TOUCH_RESOLUTION per entry, and those updates are queued and committed in batches.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        self._written_bytes = 0
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+        self._touch_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        if 'size' not in {column[1] for column in conn.execute("PRAGMA table_info(entries)")}:
+            try:  # a cache file from before entries had a size
+                conn.execute("ALTER TABLE entries ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE entries SET size = length(CAST(value AS BLOB))")
+            except sqlite3.OperationalError:  # another worker added it first
+                pass
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, include_stale=False):
+        """Return the cached value for key, or None if missing or expired."""
+        return record_lookup(key, self._get(key, include_stale))
+
+    def _get(self, key, include_stale):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at, accessed_at = row
+        now = time.time()
+        if expires_at < now and not include_stale:
+            return None
+        if now - accessed_at > TOUCH_RESOLUTION:
+            self.touch(key, now)
+        return json.loads(value)
+
+    def touch(self, key, now):
+        """Queue an accessed_at update for key, writing the queue once it is big or old enough."""
+        with self._touch_lock:
+            self._touched[key] = now
+            due = len(self._touched) >= TOUCH_BATCH_SIZE or time.monotonic() - self._flushed_at >= TOUCH_INTERVAL
+        if due:
+            self.flush_touches()
+
+    def flush_touches(self):
+        """Write every queued accessed_at update in one transaction."""
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+            self._flushed_at = time.monotonic()
+        if touched:
+            conn = self._conn()
+            conn.executemany("UPDATE entries SET accessed_at = max(accessed_at, ?) WHERE key = ?",
+                             [(accessed_at, key) for key, accessed_at in touched.items()])
+            conn.commit()
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        now = time.time()
+        value = json.dumps(value)  # ASCII-only, so its length is its size in bytes
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at, size) VALUES (?, ?, ?, ?, ?)",
+            (key, value, now + ttl, now, len(value)),
+        )
+        conn.commit()
+        self._writes += 1
+        self._written_bytes += len(value)
+        if self._writes % 100 == 0 or self._written_bytes >= self.max_bytes // 100:
+            self.evict()
+
+    def evict(self):
+        """Drop entries past the entry and byte limits, least recently used first."""
+        self.flush_touches()
+        self._written_bytes = 0
+        conn = self._conn()
+        conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            " SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            " SELECT key FROM (SELECT key, sum(size) OVER (ORDER BY accessed_at DESC, key) AS total FROM entries)"
+            " WHERE total > ?)",
+            (self.max_bytes,),
+        )
+        conn.commit()
+
+    def size(self):
+        """Bytes of stored JSON across all entries."""
+        return self._conn().execute("SELECT coalesce(sum(size), 0) FROM entries").fetchone()[0]
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM entries")
+        conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide cache, creating it from BLEND_CACHE_BACKEND on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = MemoryCache() if CACHE_BACKEND == 'memory' else SQLiteCache()
+    return _cache
+
+def set_cache(cache):
+    """Swap in a different cache backend (e.g. MemoryCache() in tests)."""
+    global _cache
+    _cache = cache
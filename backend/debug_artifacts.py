@@ -0,0 +1,83 @@
+"""Opt-in sink for debugging artifacts (intermediate DataFrames) kept off the request path.
+
+Off unless BLEND_DEBUG_ARTIFACTS_DIR is set. dump() only queues a copy of the frame; a
+background thread writes it as CSV under a unique name (so concurrent workers never clobber
+each other) and then prunes the directory down to the newest BLEND_DEBUG_ARTIFACTS_MAX_FILES
+files younger than BLEND_DEBUG_ARTIFACTS_MAX_AGE seconds. When the writer falls behind,
+new artifacts are dropped rather than queued without bound.
+"""
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+# Constants
+DEBUG_ARTIFACTS_DIR = os.environ.get('BLEND_DEBUG_ARTIFACTS_DIR')
+DEBUG_ARTIFACTS_MAX_FILES = int(os.environ.get('BLEND_DEBUG_ARTIFACTS_MAX_FILES', 200))
+DEBUG_ARTIFACTS_MAX_AGE = int(os.environ.get('BLEND_DEBUG_ARTIFACTS_MAX_AGE', 7 * 24 * 60 * 60))
+QUEUE_SIZE = 64
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def enabled():
+    return bool(DEBUG_ARTIFACTS_DIR)
+
+def artifact_path(directory, name):
+    safe_name = re.sub(r'[^\w.-]', '_', name)
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+    return os.path.join(directory, f"{stamp}-{os.getpid()}-{uuid.uuid4().hex[:8]}-{safe_name}.csv")
+
+def prune(directory, max_files=DEBUG_ARTIFACTS_MAX_FILES, max_age=DEBUG_ARTIFACTS_MAX_AGE):
+    """Delete artifacts older than max_age, then the oldest ones beyond max_files."""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith('.csv'):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:  # pruned by another worker
+                continue
+    entries.sort(reverse=True)
+    cutoff = time.time() - max_age
+    stale = [path for n, (mtime, path) in enumerate(entries) if n >= max_files or mtime < cutoff]
+    for path in stale:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return len(stale)
+
+def write_artifacts():
+    while True:
+        directory, name, df = _queue.get()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            df.to_csv(artifact_path(directory, name), index=False)
+            prune(directory, DEBUG_ARTIFACTS_MAX_FILES, DEBUG_ARTIFACTS_MAX_AGE)
+        except Exception as e:
+            print(f"Failed to write debug artifact {name}: {e}")
+        finally:
+            _queue.task_done()
+
+def dump(name, df):
+    """Queue df to be saved as a debug artifact. A no-op unless the sink is enabled."""
+    global _writer
+    if not enabled() or df is None:
+        return False
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=write_artifacts, name='debug-artifacts', daemon=True)
+            _writer.start()
+    try:
+        _queue.put_nowait((DEBUG_ARTIFACTS_DIR, name, df.copy()))
+    except queue.Full:
+        return False
+    return True
+
+def flush():
+    """Block until every queued artifact has been written."""
+    _queue.join()
@@ -0,0 +1,72 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+# Constants
+MAX_FETCH_WORKERS = int(os.environ.get('BLEND_FETCH_WORKERS', 8))
+REQUESTS_PER_SECOND = float(os.environ.get('BLEND_REQUESTS_PER_SECOND', 4))  # per host
+BURST = int(os.environ.get('BLEND_REQUEST_BURST', 8))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One token bucket per host, shared by every scraper in the process."""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=BURST):
+        self.total_rate = self.rate = rate
+        self.total_capacity = self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def share(self, processes):
+        """Limit this process to its part of the budget when `processes` worker processes scrape the same hosts."""
+        with self._lock:
+            self.rate = self.total_rate / processes
+            self.capacity = max(1, self.total_capacity // processes)
+            self._buckets.clear()
+
+    def bucket(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.capacity)
+            return self._buckets[host]
+
+    def acquire(self, url):
+        self.bucket(url).acquire()
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for retry number `attempt` (1-based)."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+rate_limiter = HostRateLimiter()
@@ -0,0 +1,432 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import numpy as np
+import pandas as pd
+
+from metrics import timed
+
+# Constants
+LOCAL_DB_PATH = 'mother22.csv'
+CATEGORICAL_COLUMNS = ['decade', 'popularity_class', 'duration_class']
+COLUMNAR_SUFFIX = '.cols'
+COLUMNAR_VERSION = 2  # text offsets in bytes, so single rows can be decoded
+MANIFEST_NAME = 'manifest.json'
+FILTER_COLUMNS = ['genres', 'directors', 'decade', 'runtime']
+LIST_ITEM = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"")  # a quoted name in a list cell
+POSTER_TABLE_PATH = os.environ.get('BLEND_POSTER_TABLE', 'posters.sqlite3')
+
+_film_dbs = {}
+_film_texts = {}
+_attribute_indexes = {}
+_film_ids = {}
+_poster_tables = {}
+_filter_indexes = {}
+_film_db_lock = threading.Lock()
+
+
+def read_film_db(path=LOCAL_DB_PATH):
+    """Parse the film database with compact dtypes, indexed by Letterboxd link."""
+    columns = pd.read_csv(path, nrows=0).columns
+    dtypes = {col: 'category' for col in CATEGORICAL_COLUMNS if col in columns}
+    film_db = pd.read_csv(path, dtype=dtypes)
+    if 'runtime' in film_db.columns:
+        film_db['runtime'] = pd.to_numeric(film_db['runtime'], errors='coerce').astype('float32')
+    film_db = film_db.drop_duplicates(subset='link').set_index('link')
+    return film_db
+
+def columnar_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + COLUMNAR_SUFFIX
+
+def build_columnar_film_db(csv_path=LOCAL_DB_PATH, out_dir=None):
+    """Convert the CSV film database into a directory of .npy column files.
+
+    Numeric columns are stored as-is, categoricals as integer codes plus their categories,
+    and text columns as one UTF-8 blob per column with byte offsets and a null mask.
+    """
+    out_dir = out_dir or columnar_path_for(csv_path)
+    os.makedirs(out_dir, exist_ok=True)
+    film_db = read_film_db(csv_path).reset_index()
+
+    manifest = {'version': COLUMNAR_VERSION, 'source': os.path.abspath(csv_path),
+                'source_mtime': os.path.getmtime(csv_path), 'rows': len(film_db), 'columns': []}
+    for col in film_db.columns:
+        series = film_db[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(out_dir, f'{col}.codes.npy'), series.cat.codes.to_numpy())
+            manifest['columns'].append({'name': col, 'kind': 'category',
+                                        'categories': [str(c) for c in series.cat.categories]})
+        elif pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            np.save(os.path.join(out_dir, f'{col}.npy'), series.to_numpy())
+            manifest['columns'].append({'name': col, 'kind': 'numeric'})
+        else:
+            valid = series.notna().to_numpy()
+            values = [str(v).encode('utf-8') if ok else b'' for v, ok in zip(series, valid)]
+            offsets = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum([len(v) for v in values], out=offsets[1:])
+            np.save(os.path.join(out_dir, f'{col}.data.npy'), np.frombuffer(b''.join(values), dtype=np.uint8))
+            np.save(os.path.join(out_dir, f'{col}.offsets.npy'), offsets)
+            np.save(os.path.join(out_dir, f'{col}.valid.npy'), valid)
+            manifest['columns'].append({'name': col, 'kind': 'text'})
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f)
+    return out_dir
+
+class TextColumn:
+    """A text column of a columnar film DB, decoded from its memory-mapped UTF-8 blob on demand."""
+
+    def __init__(self, path, name):
+        self.data = np.load(os.path.join(path, f'{name}.data.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, f'{name}.offsets.npy'), mmap_mode='r')
+        self.valid = np.load(os.path.join(path, f'{name}.valid.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.valid)
+
+    def take(self, rows=None):
+        """Values at row positions `rows` (every row when None) as an object array, NaN where missing."""
+        if rows is None:
+            blob = bytes(self.data)  # one sequential read beats a slice per row
+            offsets = self.offsets.tolist()
+            pieces = (blob[start:end] for start, end in zip(offsets, offsets[1:]))
+            valid = self.valid.tolist()
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            pieces = (bytes(self.data[start:end])
+                      for start, end in zip(self.offsets[rows].tolist(), self.offsets[rows + 1].tolist()))
+            valid = self.valid[rows].tolist()
+        return np.array([piece.decode('utf-8') if ok else np.nan for piece, ok in zip(pieces, valid)], dtype=object)
+
+def read_columnar_film_db(path):
+    """Load a built columnar film database without decoding its text: (frame, {column: TextColumn}).
+
+    Numeric and category columns are memory-mapped into the frame (indexed by link), so every
+    worker process on the host shares one copy through the OS page cache. The other text
+    columns stay in their memory-mapped blobs and are decoded per call, only for the rows a
+    caller asks for (see read_film_columns).
+    """
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+
+    data = {}
+    texts = {}
+    for meta in manifest['columns']:
+        col = meta['name']
+        if meta['kind'] == 'numeric':
+            data[col] = np.load(os.path.join(path, f'{col}.npy'), mmap_mode='r')
+        elif meta['kind'] == 'category':
+            codes = np.load(os.path.join(path, f'{col}.codes.npy'), mmap_mode='r')
+            data[col] = pd.Categorical.from_codes(codes, categories=meta['categories'])
+        elif col == 'link':
+            data[col] = TextColumn(path, col).take()
+        else:
+            texts[col] = TextColumn(path, col)
+    film_db = pd.DataFrame(data, copy=False)
+    return film_db.set_index('link'), texts
+
+def has_columnar_film_db(csv_path):
+    """True if a built columnar copy exists, is in the current format and is at least as new as the CSV."""
+    manifest_path = os.path.join(columnar_path_for(csv_path), MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != COLUMNAR_VERSION:
+        print("Columnar film DB was built by an older version; rebuild it with python film_db.py build")
+        return False
+    if os.path.exists(csv_path) and manifest['source_mtime'] < os.path.getmtime(csv_path):
+        print(f"Columnar film DB is older than {csv_path}; falling back to CSV")
+        return False
+    return True
+
+def get_film_db(path=LOCAL_DB_PATH):
+    """Return the process-wide film database, loading it on first use.
+
+    Uses the columnar copy built by `python film_db.py build` when available; its text columns
+    (other than the link index) are then left out of the frame, so read them with
+    read_film_columns.
+    """
+    film_db = _film_dbs.get(path)
+    if film_db is None:
+        with _film_db_lock:
+            film_db = _film_dbs.get(path)
+            if film_db is None:
+                if has_columnar_film_db(path):
+                    film_db, _film_texts[path] = read_columnar_film_db(columnar_path_for(path))
+                else:
+                    film_db, _film_texts[path] = read_film_db(path), {}
+                _film_dbs[path] = film_db
+    return film_db
+
+def read_film_columns(columns=None, rows=None, path=LOCAL_DB_PATH):
+    """Film DB columns (all when None) as a frame indexed by link, for every film or the ones at row positions `rows`.
+
+    Text columns of a columnar DB are decoded here for just those rows, so callers only hold
+    the strings for as long as they use them. Columns the DB doesn't have are skipped.
+    """
+    film_db = get_film_db(path)
+    texts = _film_texts[path]
+    if columns is None:
+        columns = list(film_db.columns) + list(texts)
+    frame = film_db if rows is None else film_db.iloc[rows]
+    data = {col: texts[col].take(rows) if col in texts else frame[col].array
+            for col in columns if col in texts or col in frame.columns}
+    return pd.DataFrame(data, index=frame.index, copy=False)
+
+@timed('db_merge')
+def join_film_db(df, film_db, columns=None):
+    """Attach film attributes to df by its 'link' column with an index lookup.
+
+    Overlapping columns get pd.merge's default '_x' / '_y' suffixes so callers (and the
+    frontend, which reads title_x / title_y) see the same shape as before.
+    """
+    if columns is not None:
+        film_db = film_db[[col for col in film_db.columns if col in columns]]
+    return df.join(film_db, on='link', lsuffix='_x', rsuffix='_y')
+
+
+class AttributeIndex:
+    """Comma-separated film attributes tokenized once into integer vocabularies.
+
+    For each attribute, film i's token ids are token_ids[offsets[i]:offsets[i + 1]], in the
+    same order `str.split(', ')` would produce them, so counts match the old Counter path.
+    """
+
+    def __init__(self, film_db, attributes):
+        self.index = film_db.index
+        self.vocab = {}
+        self.offsets = {}
+        self.token_ids = {}
+        for attr in attributes:
+            values = film_db[attr].astype(object)
+            tokens = values.where(values.notna()).str.split(', ')
+            lengths = tokens.str.len().fillna(0).to_numpy(dtype=np.int64)
+            flat = tokens.explode().dropna().to_numpy()
+            codes, vocab = pd.factorize(flat)
+            self.vocab[attr] = vocab
+            self.offsets[attr] = np.concatenate(([0], np.cumsum(lengths)))
+            self.token_ids[attr] = codes.astype(np.int32)
+
+    def rows_for(self, links):
+        """Film DB row positions for the given links; links missing from the DB are dropped."""
+        rows = self.index.get_indexer(links)
+        return rows[rows >= 0]
+
+    def count_vector(self, attr, rows):
+        """Sparse token counts for the films at `rows`, as (sorted token ids, counts)."""
+        offsets = self.offsets[attr]
+        starts = offsets[rows]
+        lengths = offsets[rows + 1] - starts
+        total = lengths.sum()
+        if total == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        # Gather every row's token slice in one go: position = row start + index within row
+        within = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        ids = self.token_ids[attr][np.repeat(starts, lengths) + within]
+        return np.unique(ids, return_counts=True)
+
+    def count_vectors(self, links, attributes, rows=None):
+        if rows is None:
+            rows = self.rows_for(links)
+        return {attr: self.count_vector(attr, rows) for attr in attributes}
+
+def get_attribute_index(attributes, path=LOCAL_DB_PATH):
+    """Return the process-wide AttributeIndex over the film database, building it on first use.
+
+    The attribute strings are only decoded for the build; the index keeps integer tokens.
+    """
+    key = (path, tuple(attributes))
+    index = _attribute_indexes.get(key)
+    if index is None:
+        get_film_db(path)
+        with _film_db_lock:
+            index = _attribute_indexes.get(key)
+            if index is None:
+                index = AttributeIndex(read_film_columns(attributes, path=path), attributes)
+                _attribute_indexes[key] = index
+    return index
+
+
+class FilmIds:
+    """Dense integer ids for film links.
+
+    A film in the DB gets its row position, so ids below `known` double as film DB rows. Links
+    the DB doesn't have get the next free id the first time they are seen and keep it for the
+    life of the process, so ids from different users' profiles are always comparable.
+    """
+
+    def __init__(self, film_db):
+        self.index = film_db.index
+        self.known = len(film_db.index)
+        self.extra = {}
+        self._lock = threading.Lock()
+
+    def ids_for(self, links):
+        """int64 id per link, in the order given."""
+        links = np.asarray(links, dtype=object)
+        ids = self.index.get_indexer(links).astype(np.int64)
+        unknown = np.flatnonzero(ids < 0)
+        if len(unknown):
+            with self._lock:
+                for i in unknown:
+                    ids[i] = self.extra.setdefault(links[i], self.known + len(self.extra))
+        return ids
+
+def get_film_ids(path=LOCAL_DB_PATH):
+    """Return the process-wide FilmIds over the film database."""
+    film_ids = _film_ids.get(path)
+    if film_ids is None:
+        film_db = get_film_db(path)
+        with _film_db_lock:
+            film_ids = _film_ids.get(path)
+            if film_ids is None:
+                film_ids = FilmIds(film_db)
+                _film_ids[path] = film_ids
+    return film_ids
+
+
+def list_items(value):
+    """Names in a list-valued film DB cell, e.g. "['Drama', 'Science Fiction']" -> ['Drama', 'Science Fiction']."""
+    if not isinstance(value, str):
+        return []
+    if value.startswith('['):
+        return [single or double for single, double in LIST_ITEM.findall(value)]
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+class FilterIndex:
+    """Inverted indexes for the watchlist-party filters, over film DB row positions.
+
+    genres and directors map a lower-cased name to the sorted rows of films that list it
+    exactly, decades map each decade to its rows, and runtimes are kept sorted (with the row
+    each came from) so a runtime range is two bisects. Films without a runtime are left out,
+    as the filters have always dropped them.
+    """
+
+    def __init__(self, film_db):
+        self.index = film_db.index
+        self.genres = self.inverted(film_db['genres'].map(list_items))
+        self.directors = self.inverted(film_db['directors'].map(list_items))
+        self.decades = self.inverted(film_db['decade'].astype(object).map(lambda d: [str(d)] if pd.notna(d) else []),
+                                     lower=False)
+        runtime = np.asarray(film_db['runtime'], dtype=np.float64)
+        timed = np.flatnonzero(~np.isnan(runtime))
+        order = np.argsort(runtime[timed], kind='stable')
+        self.runtime_rows = timed[order]
+        self.runtimes = runtime[timed][order]
+        self.timed_rows = timed
+
+    @staticmethod
+    def inverted(items, lower=True):
+        exploded = items.reset_index(drop=True).explode().dropna()
+        rows = exploded.index.to_numpy(dtype=np.int64)
+        codes, names = pd.factorize(exploded.str.lower() if lower else exploded)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.cumsum(np.bincount(codes, minlength=len(names)))[:-1]
+        return {name: np.unique(group) for name, group in zip(names, np.split(rows[order], bounds))}
+
+    def genre_rows(self, genre):
+        return self.genres.get(genre.lower(), np.empty(0, dtype=np.int64))
+
+    def director_rows(self, director):
+        """Films by a director named exactly `director`, or else by any director whose name contains it."""
+        director = director.lower()
+        if director in self.directors:
+            return self.directors[director]
+        return self.union(rows for name, rows in self.directors.items() if director in name)
+
+    def decade_rows(self, decade):
+        return self.union(rows for key, rows in self.decades.items() if key.startswith(str(decade)))
+
+    def runtime_rows_between(self, min_runtime, max_runtime):
+        lo = np.searchsorted(self.runtimes, min_runtime, side='left')
+        hi = np.searchsorted(self.runtimes, max_runtime, side='right')
+        return np.sort(self.runtime_rows[lo:hi])
+
+    @staticmethod
+    def union(row_arrays):
+        row_arrays = list(row_arrays)
+        return np.unique(np.concatenate(row_arrays)) if row_arrays else np.empty(0, dtype=np.int64)
+
+    def matching_rows(self, genre=None, director=None, decade=None, min_runtime=None, max_runtime=None):
+        """Sorted film DB rows passing every given filter. The runtime range needs both bounds."""
+        if min_runtime is not None and max_runtime is not None:
+            rows = self.runtime_rows_between(int(min_runtime), int(max_runtime))
+        else:
+            rows = self.timed_rows
+        # Smallest posting lists first
+        postings = []
+        if genre:
+            postings.append(self.genre_rows(genre))
+        if director:
+            postings.append(self.director_rows(director))
+        if decade:
+            postings.append(self.decade_rows(decade))
+        for posting in sorted(postings, key=len):
+            rows = np.intersect1d(rows, posting, assume_unique=True)
+        return rows
+
+    @timed('filter')
+    def filter(self, df, **filters):
+        """Rows of df (joined on its 'link' column) whose film passes the filters."""
+        rows = self.index.get_indexer(df['link'])
+        return df[np.isin(rows, self.matching_rows(**filters))]
+
+def get_filter_index(path=LOCAL_DB_PATH):
+    """Return the process-wide FilterIndex over the film database, building it on first use."""
+    index = _filter_indexes.get(path)
+    if index is None:
+        get_film_db(path)
+        with _film_db_lock:
+            index = _filter_indexes.get(path)
+            if index is None:
+                index = FilterIndex(read_film_columns(FILTER_COLUMNS, path=path))
+                _filter_indexes[path] = index
+    return index
+
+
+def open_poster_table(path=POSTER_TABLE_PATH):
+    """Open (creating if needed) the side table of poster URLs filled by prewarm_posters.py."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS posters (link TEXT PRIMARY KEY, image_url TEXT, resolved_at REAL NOT NULL)"
+    )
+    return conn
+
+def read_poster_table(path=POSTER_TABLE_PATH):
+    conn = open_poster_table(path)
+    try:
+        return dict(conn.execute("SELECT link, image_url FROM posters WHERE image_url IS NOT NULL"))
+    finally:
+        conn.close()
+
+def get_poster_urls(path=POSTER_TABLE_PATH):
+    """Return the pre-warmed {film link: poster URL} map, reloading it after the job writes more.
+
+    Empty when the job has never run.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    entry = _poster_tables.get(path)
+    if entry is None or entry[0] != mtime:
+        with _film_db_lock:
+            entry = _poster_tables.get(path)
+            if entry is None or entry[0] != mtime:
+                entry = (mtime, read_poster_table(path))
+                _poster_tables[path] = entry
+    return entry[1]
+
+
+if __name__ == '__main__':
+    # Usage: python film_db.py build [csv_path] [out_dir]
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Usage: python film_db.py build [csv_path] [out_dir]")
+        sys.exit(1)
+    csv_path = sys.argv[2] if len(sys.argv) > 2 else LOCAL_DB_PATH
+    out_dir = build_columnar_film_db(csv_path, sys.argv[3] if len(sys.argv) > 3 else None)
+    print(f"Wrote columnar film database to {out_dir}")
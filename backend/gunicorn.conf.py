@@ -0,0 +1,64 @@
+"""gunicorn settings for serving the backend: gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden through a BLEND_* environment variable. The app is preloaded
+(see wsgi.py) and forked into `workers` processes, so CPU-bound blends run in parallel; each
+worker's threads overlap the requests that are waiting on Letterboxd. Workers are recycled
+after about max_requests requests, finishing the ones in flight first. Scraped pages, lists,
+posters and jobs are cached in SQLite (cache.py), which every worker on the host shares.
+Workers write their metrics to BLEND_METRICS_DIR (a fresh temporary directory unless set),
+so /metrics reports the sum over all of them, including recycled ones.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+_loaded_at = time.perf_counter()
+
+bind = os.environ.get('BLEND_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('BLEND_WEB_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('BLEND_WEB_THREADS', 8))
+preload_app = True
+max_requests = int(os.environ.get('BLEND_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10  # so workers don't all restart at once
+timeout = int(os.environ.get('BLEND_WORKER_TIMEOUT', 120))
+graceful_timeout = 30
+# Read by metrics.py, so it must be set before the app is preloaded
+_temporary_metrics_dir = None
+if not os.environ.get('BLEND_METRICS_DIR'):
+    _temporary_metrics_dir = os.environ['BLEND_METRICS_DIR'] = tempfile.mkdtemp(prefix='blend-metrics-')
+
+
+def on_starting(server):
+    import metrics
+    os.makedirs(metrics.METRICS_DIR, exist_ok=True)
+    metrics.clear_snapshots(metrics.METRICS_DIR)  # counts from a previous run
+
+def when_ready(server):
+    import metrics
+    metrics.write_snapshot()  # what preloading recorded, before workers fork without it
+    server.log.info("Ready to serve %.2fs after start, %d workers x %d threads",
+                    time.perf_counter() - _loaded_at, server.cfg.workers, server.cfg.threads)
+
+def post_fork(server, worker):
+    # Together the workers stay within the per-host scrape rate
+    from fetcher import rate_limiter
+    import metrics
+    rate_limiter.share(server.cfg.workers)
+    metrics.start_snapshot_writer()
+
+def worker_exit(server, worker):
+    import jobs
+    import metrics
+    jobs.abandon_queued()
+    metrics.write_snapshot()
+
+def child_exit(server, worker):
+    import metrics
+    metrics.archive_snapshot(worker.pid)
+
+def on_exit(server):
+    if _temporary_metrics_dir:
+        shutil.rmtree(_temporary_metrics_dir, ignore_errors=True)
@@ -0,0 +1,81 @@
+"""Poster and avatar URL lookups, cached for a long time and resolved in concurrent batches.
+
+Only cache misses touch the network; a warm results page resolves every image from the cache.
+"""
+from async_scraper import run_all, scrape_movie_poster_async, scrape_profile_avatar_async
+from cache import get_cache, POSTER_TTL, AVATAR_TTL, IMAGE_MISS_TTL
+from film_db import get_poster_urls
+from utils import DOMAIN, scrape_movie_poster
+
+
+def film_path(film_url):
+    """Cache films by their '/film/<slug>/' path whether given a path or a full URL."""
+    return film_url[len(DOMAIN):] if film_url.startswith(DOMAIN) else film_url
+
+def poster_key(film_url):
+    return f"poster:{film_path(film_url)}"
+
+def avatar_key(username):
+    return f"avatar:{username.lower()}"
+
+def is_image_url(url):
+    return isinstance(url, str) and url.startswith('http')
+
+def remember_image(key, url, ttl):
+    # Lookups that found no usable image are kept briefly so retries don't hammer Letterboxd
+    get_cache().set(key, {'url': url}, ttl if is_image_url(url) else IMAGE_MISS_TTL)
+
+
+def resolve_images(items, key_for, fetch_async, ttl):
+    """Return {item: url or None}, fetching every cache miss concurrently with fetch_async(item)."""
+    cache = get_cache()
+    urls = {}
+    missing = []
+    for item in dict.fromkeys(items):
+        cached = cache.get(key_for(item))
+        if cached is not None:
+            urls[item] = cached['url']
+        else:
+            missing.append(item)
+
+    async def fetch(item):
+        try:
+            return await fetch_async(item)
+        except Exception as e:
+            print(f"Image lookup failed for {item}: {e}")
+            return None
+
+    if missing:
+        for item, url in zip(missing, run_all(*(fetch(item) for item in missing))):
+            remember_image(key_for(item), url, ttl)
+            urls[item] = url
+    return urls
+
+def resolve_posters(film_links):
+    """Map each film link ('/film/<slug>/' or full URL) to its poster URL, or None.
+
+    Films covered by the pre-warmed poster table (prewarm_posters.py) never reach the cache.
+    """
+    table = get_poster_urls()
+    urls = {link: table[film_path(link)] for link in film_links if film_path(link) in table}
+    urls.update(resolve_images(
+        [link for link in film_links if link not in urls], poster_key,
+        lambda link: scrape_movie_poster_async(DOMAIN + film_path(link)), POSTER_TTL,
+    ))
+    return urls
+
+def resolve_avatars(usernames):
+    """Map each username to its profile avatar URL, or None."""
+    return resolve_images(usernames, avatar_key, scrape_profile_avatar_async, AVATAR_TTL)
+
+def get_movie_poster(film_url):
+    """Cached scrape_movie_poster: returns the poster URL or raises like it does on failure."""
+    image_url = get_poster_urls().get(film_path(film_url))
+    if image_url is not None:
+        return image_url
+    cached = get_cache().get(poster_key(film_url))
+    if cached is not None and is_image_url(cached['url']):
+        return cached['url']
+    image_url = scrape_movie_poster(film_url)
+    remember_image(poster_key(film_url), image_url, POSTER_TTL)
+    return image_url
@@ -0,0 +1,129 @@
+"""Request coalescing for in-flight scrapes and a small background job queue.
+
+coalesce_async() makes concurrent callers asking for the same key share one running
+computation. Every scrape goes through it on the scrape loop, sync callers included (they
+hand their coroutines to async_scraper.run), so there is one in-flight map per process.
+submit() runs long requests on a worker pool and records their status under a job id, so
+any worker on the host can answer polls for it. A job still queued or running after
+BLEND_JOB_TIMEOUT is reported as failed, since the worker running it may have been recycled
+or killed; a worker that exits marks the jobs it never started as failed.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import get_cache
+
+# Constants
+JOB_WORKERS = int(os.environ.get('BLEND_JOB_WORKERS', 4))
+JOB_TTL = int(os.environ.get('BLEND_JOB_TTL', 60 * 60))
+JOB_TIMEOUT = int(os.environ.get('BLEND_JOB_TIMEOUT', 15 * 60))
+JOB_BACKEND = os.environ.get('BLEND_JOB_BACKEND', 'cache')
+REDIS_URL = os.environ.get('BLEND_REDIS_URL', 'redis://localhost:6379/0')
+
+_inflight_tasks = {}
+_queued_jobs = {}
+_queued_lock = threading.Lock()
+
+
+async def coalesce_async(key, make_coro):
+    """Await make_coro() unless a computation with the same key is already running; then wait for that.
+
+    Must be awaited on one event loop (no locking needed).
+    """
+    task = _inflight_tasks.get(key)
+    if task is None:
+        task = asyncio.ensure_future(make_coro())
+        _inflight_tasks[key] = task
+        task.add_done_callback(lambda _: _inflight_tasks.pop(key, None))
+    # shield so one caller being cancelled doesn't cancel the shared scrape
+    return await asyncio.shield(task)
+
+
+class CacheJobStore:
+    """Keeps job records in the shared cache (SQLite by default), visible to every local worker."""
+
+    def save(self, job):
+        get_cache().set(f"job:{job['id']}", job, JOB_TTL)
+
+    def load(self, job_id):
+        return get_cache().get(f"job:{job_id}")
+
+class RedisJobStore:
+    """Keeps job records in Redis so polls can land on any host."""
+
+    def __init__(self, url=REDIS_URL):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+
+    def save(self, job):
+        self.client.set(f"job:{job['id']}", json.dumps(job), ex=JOB_TTL)
+
+    def load(self, job_id):
+        value = self.client.get(f"job:{job_id}")
+        return json.loads(value) if value is not None else None
+
+
+_job_store = None
+_job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+
+def get_job_store():
+    global _job_store
+    if _job_store is None:
+        _job_store = RedisJobStore() if JOB_BACKEND == 'redis' else CacheJobStore()
+    return _job_store
+
+def set_job_store(store):
+    global _job_store
+    _job_store = store
+
+def submit(kind, fn, *args, **kwargs):
+    """Queue fn(*args, **kwargs) on the job pool and return its job id.
+
+    fn must return something JSON-serializable; it becomes the job's result.
+    """
+    job = {'id': uuid.uuid4().hex, 'kind': kind, 'status': 'queued', 'created_at': time.time(),
+           'result': None, 'error': None}
+    store = get_job_store()
+    store.save(job)
+    with _queued_lock:
+        _queued_jobs[job['id']] = job
+
+    def run():
+        with _queued_lock:
+            if _queued_jobs.pop(job['id'], None) is None:  # abandoned by abandon_queued()
+                return
+        store.save(dict(job, status='running', started_at=time.time()))
+        try:
+            result = fn(*args, **kwargs)
+            store.save(dict(job, status='done', finished_at=time.time(), result=result))
+        except Exception as e:
+            store.save(dict(job, status='failed', finished_at=time.time(), error=str(e)))
+
+    _job_pool.submit(run)
+    return job['id']
+
+def get_job(job_id):
+    """The job's record, marked failed if it has been queued or running for over JOB_TIMEOUT."""
+    store = get_job_store()
+    job = store.load(job_id)
+    if job is not None and job['status'] in ('queued', 'running') and time.time() - job['created_at'] > JOB_TIMEOUT:
+        job = dict(job, status='failed', finished_at=time.time(),
+                   error="Job timed out; the worker running it may have been restarted")
+        store.save(job)
+    return job
+
+def abandon_queued():
+    """Mark jobs this process accepted but hasn't started as failed (e.g. when the worker exits)."""
+    with _queued_lock:
+        abandoned = list(_queued_jobs.values())
+        _queued_jobs.clear()
+    store = get_job_store()
+    for job in abandoned:
+        store.save(dict(job, status='failed', finished_at=time.time(),
+                        error="The worker was restarted before the job started; please retry"))
+    return len(abandoned)
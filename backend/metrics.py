@@ -0,0 +1,338 @@
+"""Counters, latency histograms and timing spans, exposed in Prometheus' text format at /metrics.
+
+span() times a block into blend_span_seconds and, while a per-request profile is active
+(see start_profile), also records it on that profile so the response can report where the
+time went.
+
+Metrics are kept per process. When BLEND_METRICS_DIR is set (gunicorn.conf.py sets it for
+its workers), every process also writes its counters and histograms to <pid>.json in that
+directory every few seconds, and render() sums the files, so /metrics reports the whole
+server whichever worker answers. A recycled worker's file is folded into archive.json, so
+its counts don't vanish with it. Gauges always describe the answering process.
+"""
+import contextvars
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Constants
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROFILING_ALLOWED = os.environ.get('BLEND_ALLOW_PROFILING', '0') == '1'  # opt-in: timings leak internals
+METRICS_DIR = os.environ.get('BLEND_METRICS_DIR')
+SNAPSHOT_INTERVAL = 5  # seconds between a process's metric snapshots
+ARCHIVE_NAME = 'archive.json'
+
+_registry = []
+_current_profile = contextvars.ContextVar('blend_profile', default=None)
+
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def combine(value, other):
+        return value + other
+
+    def render(self, values=None):
+        """Exposition lines for values (label values -> count), this process's own by default."""
+        values = self.snapshot() if values is None else values
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def combine(series, other):
+        return [count + other_count for count, other_count in zip(series, other)]
+
+    def render(self, values=None):
+        """Exposition lines for values (label values -> series), this process's own by default."""
+        values = self.snapshot() if values is None else values
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Gauge:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[tuple(str(labels[name]) for name in self.labelnames)] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {value}")
+        return lines
+
+def shared_metrics():
+    """The metrics that are summed across processes (everything but gauges)."""
+    return [metric for metric in _registry if not isinstance(metric, Gauge)]
+
+def snapshot_path(directory, pid=None):
+    return os.path.join(directory, f"{pid or os.getpid()}.json")
+
+def merge_snapshot(totals, snapshot):
+    """Add one process's snapshot ({metric: [[label values, value], ...]}) into totals."""
+    combine = {metric.name: metric.combine for metric in shared_metrics()}
+    for name, series in snapshot.items():
+        if name not in combine:
+            continue
+        values = totals.setdefault(name, {})
+        for key, value in series:
+            key = tuple(key)
+            values[key] = combine[name](values[key], value) if key in values else value
+    return totals
+
+def read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):  # archived meanwhile, or not written yet
+        return {}
+
+def write_json(path, payload):
+    """Write payload to path atomically, so readers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+@contextmanager
+def directory_lock(directory, exclusive=False):
+    """Keeps render() from reading a dead worker's counts both before and after they are archived.
+
+    Only used with BLEND_METRICS_DIR (gunicorn, so POSIX); fcntl is imported here so the
+    module still loads on Windows for python app.py.
+    """
+    import fcntl
+
+    with open(os.path.join(directory, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def write_snapshot(directory=None):
+    """Save this process's counters and histograms as <pid>.json in the metrics directory."""
+    directory = directory or METRICS_DIR
+    if not directory:
+        return
+    snapshot = {metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+                for metric in shared_metrics()}
+    write_json(snapshot_path(directory), snapshot)
+
+def write_snapshots():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL)
+        try:
+            write_snapshot()
+        except OSError as e:
+            print(f"Failed to write metrics snapshot: {e}")
+
+def start_snapshot_writer():
+    """In a freshly forked worker: drop the counts inherited from the parent, then snapshot periodically.
+
+    The parent's own counts (e.g. from preloading) stay in the parent's snapshot file.
+    """
+    for metric in shared_metrics():
+        metric.reset()
+    if METRICS_DIR:
+        threading.Thread(target=write_snapshots, name='metrics-snapshots', daemon=True).start()
+
+def archive_snapshot(pid, directory=None):
+    """Fold an exited process's snapshot into archive.json, so its counts outlive it."""
+    directory = directory or METRICS_DIR
+    if not directory:
+        return
+    path = snapshot_path(directory, pid)
+    with directory_lock(directory, exclusive=True):
+        if not os.path.exists(path):
+            return
+        archive_path = os.path.join(directory, ARCHIVE_NAME)
+        totals = merge_snapshot(merge_snapshot({}, read_snapshot(archive_path)), read_snapshot(path))
+        write_json(archive_path, {name: [[list(key), value] for key, value in values.items()]
+                                  for name, values in totals.items()})
+        os.remove(path)
+
+def clear_snapshots(directory):
+    """Remove the snapshots left by a previous server run."""
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+
+def collect(directory):
+    """{metric: {label values: value}} summed over every snapshot in the directory."""
+    write_snapshot(directory)  # this process's numbers are always current
+    totals = {}
+    with directory_lock(directory):
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            merge_snapshot(totals, read_snapshot(path))
+    return totals
+
+def render():
+    """Every metric in Prometheus' text exposition format, summed across workers when sharing a directory."""
+    totals = collect(METRICS_DIR) if METRICS_DIR else None
+    lines = []
+    for metric in _registry:
+        if totals is None or isinstance(metric, Gauge):
+            lines.extend(metric.render())
+        else:
+            lines.extend(metric.render(totals.get(metric.name, {})))
+    return '\n'.join(lines) + '\n'
+
+
+span_seconds = Histogram('blend_span_seconds', "Time spent in each instrumented stage.", ['span'])
+fetch_seconds = Histogram('blend_fetch_seconds', "Latency of single Letterboxd page fetches.", ['client'])
+fetch_responses = Counter('blend_fetch_responses_total', "Letterboxd responses by status code.", ['status'])
+fetch_retries = Counter('blend_fetch_retries_total', "Page fetch attempts that were retried.")
+fetch_errors = Counter('blend_fetch_errors_total', "Page fetch attempts that failed without a response.")
+scraped_entries = Counter('blend_scraped_entries_total', "List entries scraped from Letterboxd.", ['list'])
+cache_lookups = Counter('blend_cache_lookups_total', "Cache lookups by key kind and result.", ['kind', 'result'])
+startup_seconds = Gauge('blend_startup_seconds', "Time each startup step took before serving.", ['step'])
+request_seconds = Histogram('blend_http_request_seconds', "API request latency.", ['endpoint', 'status'])
+
+
+class Profile:
+    """Spans recorded while serving one request, from any thread working on it."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.spans.append((name, seconds))
+
+    def totals(self):
+        """{span: (total seconds, count)}, in first-seen order. Concurrent spans add up."""
+        totals = {}
+        with self._lock:
+            for name, seconds in self.spans:
+                total, count = totals.get(name, (0.0, 0))
+                totals[name] = (total + seconds, count + 1)
+        return totals
+
+    def server_timing(self):
+        """The profile as a Server-Timing header value (durations in milliseconds)."""
+        entries = [f'{name};dur={total * 1000:.1f};desc="x{count}"' for name, (total, count) in self.totals().items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started_at) * 1000:.1f}")
+        return ', '.join(entries)
+
+def start_profile():
+    """Start collecting spans for the current request; pass the token to finish_profile()."""
+    profile = Profile()
+    return profile, _current_profile.set(profile)
+
+def finish_profile(token):
+    _current_profile.reset(token)
+
+def current_profile():
+    return _current_profile.get()
+
+async def with_profile(coro, profile):
+    """Await coro with `profile` as the current profile (tasks it starts inherit it)."""
+    token = _current_profile.set(profile)
+    try:
+        return await coro
+    finally:
+        _current_profile.reset(token)
+
+def record_span(name, seconds):
+    span_seconds.observe(seconds, span=name)
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add(name, seconds)
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
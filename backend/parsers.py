@@ -0,0 +1,294 @@
+"""HTML parsers for Letterboxd list, profile and film pages, behind a pluggable backend.
+
+The BeautifulSoup functions are the reference implementation. LxmlParser pulls out the same
+nodes with precompiled XPath over lxml's C parser and must return identical output;
+benchmarks/bench_parsers.py checks that against the saved fixtures.
+"""
+import json
+import os
+
+from metrics import timed
+
+# Constants
+PARSER_BACKEND = os.environ.get('BLEND_PARSER', 'lxml')
+
+
+def transform_ratings(r):
+    stars = {
+        "★": 1, "★★": 2, "★★★": 3, "★★★★": 4, "★★★★★": 5,
+        "½": 0.5, "★½": 1.5, "★★½": 2.5, "★★★½": 3.5, "★★★★½": 4.5
+    }
+    return stars.get(r, None)
+
+def get_last_page(soup):
+    try:
+        return int(soup.select("li.paginate-page")[-1].get_text(strip=True))
+    except (IndexError, ValueError):
+        return 1
+
+def parse_diary_entries(soup):
+    entries = []
+    for entry in soup.find_all("tr", class_="diary-entry-row"):
+        title_tag = entry.find("h3", class_="headline-3 prettify").find("a")
+        if not title_tag:
+            continue
+
+        movie_id = entry.get("data-object-id", "").split(":")[-1]
+        title = title_tag.text.strip()
+        link = entry.find("td", class_="td-actions")["data-film-link"].strip()
+
+        date_link_tag = entry.find("td", class_="td-day").find("a", href=True)
+        diary_date = date_link_tag["href"].split("/for/")[-1].strip() if date_link_tag else "Unknown"
+
+        rating_tag = entry.find("td", class_="td-rating")
+        rating = None
+        if rating_tag and rating_tag.find("span", class_="rating"):
+            rating_text = rating_tag.find("span", class_="rating").text.strip()
+            rating = transform_ratings(rating_text)
+
+        entries.append((movie_id, title, rating, diary_date, link))
+    return entries
+
+def parse_movies(soup):
+    ul = soup.find("ul", class_="poster-list")
+    if not ul:
+        return []
+
+    movies = []
+    for li in ul.find_all("li"):
+        try:
+            div = li.find("div")
+            film_id = div['data-film-id']
+            title = li.find('img')['alt']
+            rating_str = li.find('p', class_="poster-viewingdata").get_text(strip=True)
+            rating = transform_ratings(rating_str)
+            liked = li.find('span', class_='like') is not None
+            link = div['data-target-link']
+            movies.append((film_id, title, rating, liked, link))
+        except Exception:
+            continue
+    return movies
+
+def parse_watchlist_page(soup):
+    """Parses a single watchlist page and extracts movie data."""
+    ul = soup.find("ul", class_="poster-list")
+
+    if not ul:
+        return []
+
+    movies = []
+    for movie in ul.find_all("li"):
+        movies.append((
+            movie.find("div")["data-film-id"],
+            movie.find("img")["alt"],
+            movie.find("div")["data-target-link"],
+        ))
+
+    return movies
+
+def parse_profile_avatar(soup):
+    avatar_span = soup.find("span", class_="avatar -a500 -borderless -large")
+    if avatar_span:
+        img_tag = avatar_span.find("img")
+        if img_tag and img_tag.get('src', '').startswith('http'):
+            return img_tag['src']
+    return None
+
+def parse_movie_poster(soup):
+    """Extract the poster URL from a film page's JSON-LD block."""
+    # Find the <script> tag containing JSON-LD data
+    script_tag = soup.find('script', {'type': 'application/ld+json'})
+
+    if script_tag:
+        # Clean the script content by removing any CDATA comments
+        script_content = script_tag.string.strip().replace('/* <![CDATA[ */', '').replace('/* ]]> */', '')
+
+        # Load the content of the script as JSON
+        json_data = json.loads(script_content)
+
+        # Extract the image URL from the JSON data
+        return json_data.get('image', 'No image found')
+    else:
+        raise ValueError("Could not find the JSON-LD script tag.")
+
+
+class SoupParser:
+    """The reference parsers: BeautifulSoup with Python's html.parser."""
+    name = 'bs4'
+    list_parsers = {'films': parse_movies, 'diary': parse_diary_entries, 'watchlist': parse_watchlist_page}
+
+    def soup(self, content):
+        from bs4 import BeautifulSoup  # only needed when this backend is picked
+        return BeautifulSoup(content, 'html.parser')
+
+    @timed('parse')
+    def list_page(self, list_type, content):
+        """Return (rows as tuples, last page number) for one page of a films/diary/watchlist list."""
+        soup = self.soup(content)
+        return self.list_parsers[list_type](soup), get_last_page(soup)
+
+    @timed('parse')
+    def profile_avatar(self, content):
+        return parse_profile_avatar(self.soup(content))
+
+    @timed('parse')
+    def movie_poster(self, content):
+        return parse_movie_poster(self.soup(content))
+
+
+def _has_class(name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+def _text(node):
+    """bs4's get_text(strip=True): every descendant text node, stripped and concatenated."""
+    return ''.join(text.strip() for text in node.itertext())
+
+def _first(nodes):
+    return nodes[0] if nodes else None
+
+class LxmlParser:
+    """Same output as SoupParser, using lxml's C HTML parser and XPath to visit only the needed nodes.
+
+    Lookups mirror the bs4 calls one for one (first descendant for find(), class-token match
+    for single classes, exact match for multi-class strings), so malformed entries are skipped
+    or raise in the same places.
+    """
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree, html
+        self.html = html
+        # bs4 sniffs the declared charset and falls back to UTF-8, which is what Letterboxd serves
+        self.parser = html.HTMLParser(encoding='utf-8')
+        xpath = etree.XPath
+        self.last_page = xpath(f'//li[{_has_class("paginate-page")}]')
+        self.poster_list = xpath(f'//ul[{_has_class("poster-list")}][1]')
+        self.poster_items = xpath('.//li')
+        self.first_div = xpath('(.//div)[1]')
+        self.first_img = xpath('(.//img)[1]')
+        self.viewing_data = xpath(f'(.//p[{_has_class("poster-viewingdata")}])[1]')
+        self.like = xpath(f'(.//span[{_has_class("like")}])[1]')
+        self.diary_rows = xpath(f'//tr[{_has_class("diary-entry-row")}]')
+        self.diary_headline = xpath('(.//h3[normalize-space(@class)="headline-3 prettify"])[1]')
+        self.first_link = xpath('(.//a)[1]')
+        self.actions_cell = xpath(f'(.//td[{_has_class("td-actions")}])[1]')
+        self.day_cell = xpath(f'(.//td[{_has_class("td-day")}])[1]')
+        self.first_href = xpath('(.//a[@href])[1]')
+        self.rating_cell = xpath(f'(.//td[{_has_class("td-rating")}])[1]')
+        self.rating_span = xpath(f'(.//span[{_has_class("rating")}])[1]')
+        self.avatar_span = xpath('(//span[normalize-space(@class)="avatar -a500 -borderless -large"])[1]')
+        self.json_ld = xpath('(//script[@type="application/ld+json"])[1]')
+
+    def root(self, content):
+        if isinstance(content, bytes):
+            return self.html.fromstring(content, parser=self.parser)
+        return self.html.fromstring(content)
+
+    @timed('parse')
+    def list_page(self, list_type, content):
+        root = self.root(content)
+        if list_type == 'films':
+            rows = self.films(root)
+        elif list_type == 'diary':
+            rows = self.diary(root)
+        else:
+            rows = self.watchlist(root)
+        return rows, self.get_last_page(root)
+
+    def get_last_page(self, root):
+        try:
+            return int(_text(self.last_page(root)[-1]))
+        except (IndexError, ValueError):
+            return 1
+
+    def films(self, root):
+        ul = _first(self.poster_list(root))
+        if ul is None:
+            return []
+
+        movies = []
+        for li in self.poster_items(ul):
+            try:
+                div = _first(self.first_div(li))
+                film_id = div.attrib['data-film-id']
+                title = _first(self.first_img(li)).attrib['alt']
+                rating = transform_ratings(_text(_first(self.viewing_data(li))))
+                liked = bool(self.like(li))
+                link = div.attrib['data-target-link']
+                movies.append((film_id, title, rating, liked, link))
+            except Exception:
+                continue
+        return movies
+
+    def diary(self, root):
+        entries = []
+        for entry in self.diary_rows(root):
+            title_tag = _first(self.first_link(_first(self.diary_headline(entry))))
+            if title_tag is None:
+                continue
+
+            movie_id = entry.get("data-object-id", "").split(":")[-1]
+            title = title_tag.text_content().strip()
+            link = _first(self.actions_cell(entry)).attrib["data-film-link"].strip()
+
+            date_link_tag = _first(self.first_href(_first(self.day_cell(entry))))
+            diary_date = date_link_tag.get("href").split("/for/")[-1].strip() if date_link_tag is not None else "Unknown"
+
+            rating_tag = _first(self.rating_cell(entry))
+            rating_span = _first(self.rating_span(rating_tag)) if rating_tag is not None else None
+            rating = transform_ratings(rating_span.text_content().strip()) if rating_span is not None else None
+
+            entries.append((movie_id, title, rating, diary_date, link))
+        return entries
+
+    def watchlist(self, root):
+        ul = _first(self.poster_list(root))
+        if ul is None:
+            return []
+        return [
+            (
+                _first(self.first_div(li)).attrib["data-film-id"],
+                _first(self.first_img(li)).attrib["alt"],
+                _first(self.first_div(li)).attrib["data-target-link"],
+            )
+            for li in self.poster_items(ul)
+        ]
+
+    @timed('parse')
+    def profile_avatar(self, content):
+        avatar_span = _first(self.avatar_span(self.root(content)))
+        if avatar_span is not None:
+            img_tag = _first(self.first_img(avatar_span))
+            if img_tag is not None and img_tag.get('src', '').startswith('http'):
+                return img_tag.get('src')
+        return None
+
+    @timed('parse')
+    def movie_poster(self, content):
+        script_tag = _first(self.json_ld(self.root(content)))
+        if script_tag is None:
+            raise ValueError("Could not find the JSON-LD script tag.")
+        script_content = script_tag.text.strip().replace('/* <![CDATA[ */', '').replace('/* ]]> */', '')
+        return json.loads(script_content).get('image', 'No image found')
+
+
+PARSERS = {'bs4': SoupParser, 'lxml': LxmlParser}
+_parser = None
+
+def make_parser(name):
+    try:
+        return PARSERS[name]()
+    except ImportError:
+        print(f"Parser backend '{name}' is not installed; falling back to bs4")
+        return SoupParser()
+
+def get_parser():
+    """Return the process-wide parser backend chosen by BLEND_PARSER (lxml when available)."""
+    global _parser
+    if _parser is None:
+        _parser = make_parser(PARSER_BACKEND)
+    return _parser
+
+def set_parser(name):
+    global _parser
+    _parser = make_parser(name)
@@ -0,0 +1,81 @@
+"""Offline job: resolve the poster URL of every film in the local database into the poster side table.
+
+Usage: python prewarm_posters.py [csv_path] [--table PATH] [--concurrency N] [--batch-size N]
+                                 [--limit N] [--retry-failed]
+
+Each batch is committed as it finishes, so an interrupted run picks up where it stopped.
+Films whose lookup failed are recorded with no URL and only retried with --retry-failed.
+"""
+import argparse
+import asyncio
+import time
+
+from async_scraper import run, scrape_movie_poster_async
+from film_db import LOCAL_DB_PATH, POSTER_TABLE_PATH, get_film_db, open_poster_table
+from fetcher import MAX_FETCH_WORKERS
+from utils import DOMAIN
+
+# Constants
+BATCH_SIZE = 200
+
+
+async def resolve_batch(links, concurrency):
+    """Poster URL (or None) for each film link, at most `concurrency` page fetches at a time."""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def resolve(link):
+        async with slots:
+            try:
+                image_url = await scrape_movie_poster_async(DOMAIN + link)
+            except Exception as e:
+                print(f"Poster lookup failed for {link}: {e}")
+                return None
+        return image_url if isinstance(image_url, str) and image_url.startswith('http') else None
+
+    return await asyncio.gather(*(resolve(link) for link in links))
+
+def pending_links(conn, links, retry_failed=False):
+    """Film links the side table has no answer for yet (or only a failed one, with retry_failed)."""
+    query = "SELECT link FROM posters" + (" WHERE image_url IS NOT NULL" if retry_failed else "")
+    done = {link for (link,) in conn.execute(query)}
+    return [link for link in links if link not in done]
+
+def prewarm_posters(csv_path=LOCAL_DB_PATH, table_path=POSTER_TABLE_PATH, concurrency=MAX_FETCH_WORKERS,
+                    batch_size=BATCH_SIZE, limit=None, retry_failed=False):
+    links = [link for link in get_film_db(csv_path).index if isinstance(link, str)]
+    conn = open_poster_table(table_path)
+    try:
+        pending = pending_links(conn, links, retry_failed)
+        print(f"{len(links) - len(pending)} of {len(links)} films already resolved, {len(pending)} to go")
+        todo = pending[:limit]
+
+        resolved = 0
+        started_at = time.time()
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            image_urls = run(resolve_batch(batch, concurrency))
+            now = time.time()
+            with conn:  # one transaction per batch is the checkpoint
+                conn.executemany(
+                    "INSERT OR REPLACE INTO posters (link, image_url, resolved_at) VALUES (?, ?, ?)",
+                    [(link, image_url, now) for link, image_url in zip(batch, image_urls)],
+                )
+            resolved += sum(image_url is not None for image_url in image_urls)
+            done = start + len(batch)
+            rate = done / max(now - started_at, 1e-9)
+            print(f" {done}/{len(todo)} looked up, {resolved} posters found ({rate:.1f} films/s)")
+    finally:
+        conn.close()
+    return resolved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pre-warm poster URLs for every film in the local database.")
+    parser.add_argument('csv_path', nargs='?', default=LOCAL_DB_PATH)
+    parser.add_argument('--table', default=POSTER_TABLE_PATH, help="poster side table (SQLite)")
+    parser.add_argument('--concurrency', type=int, default=MAX_FETCH_WORKERS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--limit', type=int, default=None, help="stop after this many films")
+    parser.add_argument('--retry-failed', action='store_true', help="look up films that failed before again")
+    args = parser.parse_args()
+    prewarm_posters(args.csv_path, args.table, args.concurrency, args.batch_size, args.limit, args.retry_failed)
@@ -0,0 +1,341 @@
+"""Per-user taste profiles, built once and reused by every blend a user appears in.
+
+A profile keeps the user's films as sorted dense film ids (see film_db.FilmIds) with the
+ratings aligned to them, so common films, union sizes and rank correlations are sorted-array
+operations in NumPy rather than merges on link strings.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cache import PROFILE_TTL
+from film_db import get_attribute_index, get_film_ids
+from metrics import span, timed
+from utils import BLEND_ATTRIBUTES, BLEND_WEIGHTS, compare_attributes
+
+# Constants
+MAX_PROFILES = 2000
+
+_profiles = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+class UserProfile:
+    """The side of a blend that only depends on one user.
+
+    version is the fetched_at timestamp of the scraped films snapshot the profile was built
+    from, so a profile is rebuilt exactly when its underlying scrape changes. film_ids are the
+    user's films as sorted unique ids and film_ratings their ratings in the same order (NaN
+    when unrated).
+    """
+
+    def __init__(self, username, df_films, version=None):
+        self.username = username
+        self.version = version
+        self.built_at = time.time()
+        with span('profile_build'):
+            films = df_films.drop_duplicates(subset='link')
+            film_ids = get_film_ids()
+            ids = film_ids.ids_for(films['link'])
+            order = np.argsort(ids, kind='stable')
+            self.film_ids = ids[order]
+            self.film_ratings = films['rating'].astype(float).to_numpy()[order]
+            rows = self.film_ids[self.film_ids < film_ids.known]
+            self.attribute_counts = get_attribute_index(BLEND_ATTRIBUTES).count_vectors(
+                None, BLEND_ATTRIBUTES, rows=rows
+            )
+
+    def is_fresh(self):
+        return self.version is not None and time.time() - self.version <= PROFILE_TTL
+
+
+def remember_profile(profile):
+    key = profile.username.lower()
+    with _profiles_lock:
+        _profiles[key] = profile
+        _profiles.move_to_end(key)
+        while len(_profiles) > MAX_PROFILES:
+            _profiles.popitem(last=False)
+
+def get_user_profiles(usernames):
+    """Return a UserProfile per username, scraping (concurrently) only users without a fresh one."""
+    from async_scraper import run_all, scrape_films_async
+
+    profiles = {}
+    for username in usernames:
+        profile = _profiles.get(username.lower())
+        if profile is not None and profile.is_fresh():
+            profiles[username] = profile
+
+    missing = [username for username in dict.fromkeys(usernames) if username not in profiles]
+    frames = run_all(*(scrape_films_async(username) for username in missing)) if missing else []
+    for username, df_films in zip(missing, frames):
+        profiles[username] = profile_from_films(username, df_films)
+
+    return [profiles[username] for username in usernames]
+
+def profile_from_films(username, df_films):
+    """Return the UserProfile for an already-scraped films frame, reusing one of the same version."""
+    cached = _profiles.get(username.lower())
+    version = df_films.attrs.get('fetched_at')
+    if cached is not None and version is not None and cached.version == version:
+        return cached
+    profile = UserProfile(username, df_films, version)
+    if version is not None:  # don't keep profiles built from a failed scrape
+        remember_profile(profile)
+    return profile
+
+def get_user_profile(username):
+    return get_user_profiles([username])[0]
+
+
+def attribute_similarity(profile1, profile2):
+    """Weighted attribute Jaccard of two profiles, scaled to at most 1."""
+    total_weighted_jaccard = compare_attributes(
+        profile1.attribute_counts, profile2.attribute_counts, BLEND_ATTRIBUTES, BLEND_WEIGHTS
+    )
+    total_weighted_jaccard /= sum(BLEND_WEIGHTS)
+    return min(total_weighted_jaccard, 1)
+
+def attribute_similarity_one_vs_many(profile, others):
+    """attribute_similarity of profile against each of others, as an array.
+
+    Per attribute, profile's counts are spread over the vocabulary once, so the others' summed
+    minimums come from one gather and a grouped bincount. Counts are integers, so the result
+    is exactly what the pairwise version gives.
+    """
+    n = len(others)
+    attribute_index = get_attribute_index(BLEND_ATTRIBUTES)
+    total_weighted_jaccard = np.zeros(n)
+    for attr, weight in zip(BLEND_ATTRIBUTES, BLEND_WEIGHTS):
+        ids, counts = profile.attribute_counts[attr]
+        dense = np.zeros(len(attribute_index.vocab[attr]), dtype=np.int64)
+        dense[ids] = counts
+        vectors = [other.attribute_counts[attr] for other in others]
+        owners = np.repeat(np.arange(n), [len(other_ids) for other_ids, _ in vectors])
+        other_ids = np.concatenate([other_ids for other_ids, _ in vectors])
+        other_counts = np.concatenate([other_counts for _, other_counts in vectors]).astype(np.int64)
+        intersection = np.bincount(owners, np.minimum(dense[other_ids], other_counts), minlength=n)
+        union = int(counts.sum()) + np.bincount(owners, other_counts, minlength=n) - intersection
+        with np.errstate(divide='ignore', invalid='ignore'):
+            total_weighted_jaccard += np.where(union > 0, intersection / union, 0) * weight
+    return np.minimum(total_weighted_jaccard / sum(BLEND_WEIGHTS), 1)
+
+@timed('similarity')
+def blend_profiles(profile1, profile2):
+    """Blend percentage (0-100) between two users' profiles."""
+    # Calculate total weighted Jaccard similarity
+    total_weighted_jaccard = attribute_similarity(profile1, profile2)
+
+    # Calculate proportion of common films
+    _, idx1, idx2 = np.intersect1d(profile1.film_ids, profile2.film_ids, assume_unique=True, return_indices=True)
+    total_movies = len(profile1.film_ids) + len(profile2.film_ids) - len(idx1)
+    proportion_common = len(idx1) / total_movies if total_movies > 0 else 0
+    proportion_common = min(proportion_common, 1)
+
+    # Filter out unrated movies for Spearman's calculation
+    ratings1 = profile1.film_ratings[idx1]
+    ratings2 = profile2.film_ratings[idx2]
+    rated = ~np.isnan(ratings1) & ~np.isnan(ratings2)
+    ratings1, ratings2 = ratings1[rated], ratings2[rated]
+
+    # Calculate Spearman's rank correlation coefficient for ratings
+    if len(ratings1) > 1:
+        spearman_corr = spearman(ratings1, ratings2)
+        spearman_normalized = min((spearman_corr + 1) / 2, 1)  # Ensure Spearman does not exceed 1
+    else:
+        spearman_normalized = 0
+
+    # Compute blend percentage
+    blend_percentage = (0.2 * proportion_common) + (0.9 * spearman_normalized) + (0.15 * total_weighted_jaccard)
+    blend_percentage = min(blend_percentage, 1)
+
+    # Round off the blend percentage to the nearest whole number
+    return round(blend_percentage * 100)
+
+def average_ranks(values):
+    """1-based ranks where tied values share their average rank (scipy's rankdata 'average')."""
+    sorter = np.argsort(values, kind='mergesort')
+    sorted_values = values[sorter]
+    first = np.r_[True, sorted_values[1:] != sorted_values[:-1]]
+    starts = np.r_[np.flatnonzero(first), len(values)]
+    group = np.cumsum(first) - 1
+    ranks = np.empty(len(values))
+    ranks[sorter] = (starts[group] + starts[group + 1] + 1) / 2
+    return ranks
+
+def spearman(x, y):
+    """Spearman's rank correlation of two NaN-free arrays, as spearmanr computes it (NaN if either is constant)."""
+    rx = average_ranks(x) - (len(x) + 1) / 2
+    ry = average_ranks(y) - (len(y) + 1) / 2
+    denominator = np.sqrt((rx @ rx) * (ry @ ry))
+    if denominator == 0:
+        return np.nan
+    return float(np.clip((rx @ ry) / denominator, -1, 1))
+
+def grouped_average_ranks(groups, values):
+    """average_ranks of values computed separately within each group (groups as integer labels)."""
+    if len(values) == 0:
+        return np.empty(0)
+    sorter = np.lexsort((values, groups))
+    sorted_groups = groups[sorter]
+    sorted_values = values[sorter]
+    first = np.r_[True, (sorted_groups[1:] != sorted_groups[:-1]) | (sorted_values[1:] != sorted_values[:-1])]
+    starts = np.r_[np.flatnonzero(first), len(values)]
+    tie_group = np.cumsum(first) - 1
+    group_start = np.searchsorted(sorted_groups, sorted_groups)
+    ranks = np.empty(len(values))
+    ranks[sorter] = (starts[tie_group] + starts[tie_group + 1] + 1) / 2 - group_start
+    return ranks
+
+@timed('similarity')
+def blend_one_vs_many(profile, others):
+    """Blend percentages of one profile against each of others, in order.
+
+    Gives exactly what blend_profiles gives pair by pair (None where that would fail on an
+    undefined rank correlation), but matches every other user's films against profile's
+    sorted ids with one searchsorted and gets the per-user counts and Spearman sums from
+    grouped bincounts. Ranks are multiples of 0.5, so the rank sums are exact whatever the
+    summation order.
+    """
+    n = len(others)
+    if n == 0:
+        return []
+    sizes = np.array([len(other.film_ids) for other in others], dtype=np.int64)
+    owners = np.repeat(np.arange(n), sizes)
+    ids = np.concatenate([other.film_ids for other in others])
+    ratings = np.concatenate([other.film_ratings for other in others])
+
+    # Proportion of common films
+    positions = np.searchsorted(profile.film_ids, ids)
+    found = positions < len(profile.film_ids)
+    found[found] = profile.film_ids[positions[found]] == ids[found]
+    common = np.bincount(owners[found], minlength=n)
+    union = len(profile.film_ids) + sizes - common
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proportion_common = np.minimum(np.where(union > 0, common / union, 0), 1)
+
+    # Spearman over the films both users rated, per other user
+    mine = profile.film_ratings[positions[found]]
+    theirs = ratings[found]
+    owners = owners[found]
+    rated = ~np.isnan(mine) & ~np.isnan(theirs)
+    mine, theirs, owners = mine[rated], theirs[rated], owners[rated]
+    rated_common = np.bincount(owners, minlength=n)
+    mean_rank = (rated_common[owners] + 1) / 2
+    rx = grouped_average_ranks(owners, mine) - mean_rank
+    ry = grouped_average_ranks(owners, theirs) - mean_rank
+    cov = np.bincount(owners, rx * ry, minlength=n)
+    denominator = np.sqrt(np.bincount(owners, rx * rx, minlength=n) * np.bincount(owners, ry * ry, minlength=n))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.where(denominator > 0, np.clip(cov / denominator, -1, 1), np.nan)
+    spearman_normalized = np.where(rated_common > 1, np.minimum((corr + 1) / 2, 1), 0)
+
+    total_weighted_jaccard = attribute_similarity_one_vs_many(profile, others)
+    blend = np.minimum((0.2 * proportion_common) + (0.9 * spearman_normalized) + (0.15 * total_weighted_jaccard), 1)
+    return [None if np.isnan(value) else round(float(value) * 100) for value in blend]
+
+def blend_one_to_many(username, others):
+    """Blend one user against several others, building each profile only once."""
+    profiles = get_user_profiles([username] + list(others))
+    return dict(zip((other.username for other in profiles[1:]), blend_one_vs_many(profiles[0], profiles[1:])))
+
+
+def pairwise_spearman(ratings):
+    """Spearman correlation for every pair of rows of a users x films rating matrix (NaN = unrated).
+
+    Each pair is ranked over only the films both users rated, as spearmanr would. Ratings take
+    few distinct values, so per pair we only need the L x L contingency table of rating levels,
+    and all n^2 tables come out of one matrix product. Ties get average ranks, matching scipy.
+    Returns (correlation matrix, rated-in-common counts); correlation is NaN where undefined.
+    """
+    n, _ = ratings.shape
+    levels = np.unique(ratings[~np.isnan(ratings)])
+    num_levels = len(levels)
+    if num_levels == 0:
+        return np.full((n, n), np.nan), np.zeros((n, n), dtype=np.int64)
+
+    # one_hot[i * L + l, f] = 1 if user i rated film f at level l
+    level_idx = np.searchsorted(levels, np.nan_to_num(ratings, nan=levels[0]))
+    one_hot = (level_idx[:, None, :] == np.arange(num_levels)[None, :, None]) & ~np.isnan(ratings)[:, None, :]
+    one_hot = one_hot.reshape(n * num_levels, -1).astype(np.float32)
+    tables = (one_hot @ one_hot.T).reshape(n, num_levels, n, num_levels).transpose(0, 2, 1, 3)
+    tables = np.rint(tables).astype(np.float64)  # tables[i, j, l, k] = films i rated l and j rated k
+
+    row_counts = tables.sum(axis=3)
+    col_counts = tables.sum(axis=2)
+    total = row_counts.sum(axis=2)
+    mean_rank = (total + 1) / 2
+    row_ranks = np.cumsum(row_counts, axis=2) - row_counts + (row_counts + 1) / 2 - mean_rank[..., None]
+    col_ranks = np.cumsum(col_counts, axis=2) - col_counts + (col_counts + 1) / 2 - mean_rank[..., None]
+    cov = np.einsum('ijlk,ijl,ijk->ij', tables, row_ranks, col_ranks)
+    var_row = np.einsum('ijl,ijl->ij', row_counts, row_ranks ** 2)
+    var_col = np.einsum('ijk,ijk->ij', col_counts, col_ranks ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.sqrt(var_row * var_col)
+    return corr, total.astype(np.int64)
+
+def pairwise_weighted_jaccard(count_vectors):
+    """Weighted Jaccard for every pair of users' sparse (ids, counts) vectors of one attribute."""
+    n = len(count_vectors)
+    vocab = np.unique(np.concatenate([ids for ids, _ in count_vectors] + [np.empty(0, dtype=np.int32)]))
+    dense = np.zeros((n, len(vocab)), dtype=np.int64)
+    for i, (ids, counts) in enumerate(count_vectors):
+        dense[i, np.searchsorted(vocab, ids)] = counts
+    sizes = dense.sum(axis=1)
+
+    jaccard = np.zeros((n, n))
+    for i in range(n - 1):
+        intersection = np.minimum(dense[i], dense[i + 1:]).sum(axis=1)
+        union = sizes[i] + sizes[i + 1:] - intersection
+        with np.errstate(divide='ignore', invalid='ignore'):
+            jaccard[i, i + 1:] = np.where(union > 0, intersection / union, 0)
+    return jaccard + jaccard.T
+
+def blend_matrix(usernames):
+    """Full pairwise blend matrix for a group, scraping or loading each profile exactly once."""
+    return blend_profiles_matrix(get_user_profiles(usernames))
+
+@timed('similarity')
+def blend_profiles_matrix(profiles):
+    """Full pairwise blend matrix of profiles, in their order.
+
+    Uses the same formula as blend_profiles, computed in batch over aligned matrices. Cells
+    are None on the diagonal and where the rank correlation is undefined (e.g. constant ratings).
+    """
+    n = len(profiles)
+
+    # Align everyone's films on one shared column index
+    all_ids = np.unique(np.concatenate([profile.film_ids for profile in profiles]))
+    membership = np.zeros((n, len(all_ids)), dtype=np.float32)
+    ratings = np.full((n, len(all_ids)), np.nan)
+    for i, profile in enumerate(profiles):
+        cols = np.searchsorted(all_ids, profile.film_ids)
+        membership[i, cols] = 1
+        ratings[i, cols] = profile.film_ratings
+
+    # Proportion of common films
+    sizes = membership.sum(axis=1, dtype=np.float64)
+    common = np.rint(membership @ membership.T).astype(np.float64)
+    union = sizes[:, None] + sizes[None, :] - common
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proportion_common = np.minimum(np.where(union > 0, common / union, 0), 1)
+
+    # Spearman over films both users rated
+    corr, rated_common = pairwise_spearman(ratings)
+    spearman_normalized = np.where(rated_common > 1, np.minimum((corr + 1) / 2, 1), 0)
+
+    # Weighted attribute Jaccard
+    total_weighted_jaccard = np.zeros((n, n))
+    for attr, weight in zip(BLEND_ATTRIBUTES, BLEND_WEIGHTS):
+        jaccard = pairwise_weighted_jaccard([profile.attribute_counts[attr] for profile in profiles])
+        total_weighted_jaccard += jaccard * weight
+    total_weighted_jaccard = np.minimum(total_weighted_jaccard / sum(BLEND_WEIGHTS), 1)
+
+    blend = np.minimum(0.2 * proportion_common + 0.9 * spearman_normalized + 0.15 * total_weighted_jaccard, 1)
+    return [
+        [None if i == j or np.isnan(blend[i, j]) else int(round(blend[i, j] * 100)) for j in range(n)]
+        for i in range(n)
+    ]
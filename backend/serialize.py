@@ -0,0 +1,51 @@
+"""JSON serialization for API responses built from DataFrames.
+
+records() turns a frame into JSON-ready rows column by column: missing values (NaN, None,
+NaT) become None with one isna() pass per column instead of a walk over every cell, and
+columns the client didn't ask for are never converted. dumps() uses orjson when it is
+installed and falls back to the standard library.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Constants
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def project(df, fields=None):
+    """df restricted to the requested fields that exist, in the requested order (all columns if None)."""
+    if fields is None:
+        return df
+    return df[[field for field in dict.fromkeys(fields) if field in df.columns]]
+
+def column_values(column):
+    """A column as a list of plain Python values, with missing values as None."""
+    values = column.tolist()
+    missing = column.isna().to_numpy()
+    if missing.any():
+        for i in missing.nonzero()[0]:
+            values[i] = None
+    return values
+
+def records(df, fields=None):
+    """Rows of df as dicts (like to_dict(orient='records')), NaN-free and optionally projected."""
+    df = project(df, fields)
+    names = list(df.columns)
+    if not names:
+        return [{} for _ in range(len(df))]
+    columns = [column_values(df.iloc[:, i]) for i in range(len(names))]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+def default(obj):
+    item = getattr(obj, 'item', None)  # numpy scalars
+    return item() if callable(item) else str(obj)
+
+def dumps(payload):
+    """payload as UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=default, option=ORJSON_OPTIONS)
+    return json.dumps(payload, default=default, separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,104 @@
+"""Newline-delimited JSON progress streams for the long-running endpoints.
+
+Each line is one event: 'page' as every scraped page is parsed, 'user_done' when a user's
+list is complete, optional 'partial' results, then a final 'result' (or 'error').
+"""
+import queue
+import threading
+from collections import Counter
+
+from profiles import blend_profiles, profile_from_films
+from serialize import dumps
+from utils import iter_profile_pages, intersect_watchlists, watchlist_party_from_common
+
+
+def ndjson(event):
+    return dumps(event) + b"\n"
+
+def iter_profiles_progress(list_type, usernames, frames):
+    """Scrape several users' lists side by side, yielding an event per parsed page.
+
+    Each user's scrape runs on its own thread (not the fetch pool, whose workers it waits on).
+    Finished DataFrames are stored in `frames` by username before the generator ends.
+    """
+    events = queue.Queue()
+
+    def scrape(username):
+        try:
+            pages = iter_profile_pages(list_type, username)
+            while True:
+                try:
+                    page, last_page, rows = next(pages)
+                except StopIteration as done:
+                    frames[username] = done.value
+                    break
+                events.put({'event': 'page', 'username': username, 'list': list_type,
+                            'page': page, 'pages': last_page, 'rows': len(rows)})
+            events.put({'event': 'user_done', 'username': username, 'list': list_type,
+                        'count': len(frames[username])})
+        except Exception as e:
+            events.put({'event': 'error', 'username': username, 'error': str(e)})
+        finally:
+            events.put(None)
+
+    for username in usernames:
+        threading.Thread(target=scrape, args=(username,), daemon=True).start()
+
+    remaining = len(usernames)
+    while remaining:
+        event = events.get()
+        if event is None:
+            remaining -= 1
+        else:
+            yield event
+
+def unloaded_error(usernames, frames):
+    """A final 'error' event when some user's list couldn't be loaded (their own 'error' event says why)."""
+    missing = [username for username in usernames if username not in frames]
+    if missing:
+        return {'event': 'error', 'error': f"Couldn't load the profiles of: {', '.join(missing)}", 'usernames': missing}
+    return None
+
+def stream_blend(username1, username2):
+    frames = {}
+    yield from iter_profiles_progress('films', [username1, username2], frames)
+    error = unloaded_error([username1, username2], frames)
+    if error:
+        yield error
+        return
+    try:
+        profile1 = profile_from_films(username1, frames[username1])
+        profile2 = profile_from_films(username2, frames[username2])
+        yield {'event': 'result', 'blend_percentage': blend_profiles(profile1, profile2)}
+    except Exception as e:
+        yield {'event': 'error', 'error': str(e)}
+
+def stream_watchlist_party(usernames, genre=None, director=None, decade=None, min_runtime=None, max_runtime=None,
+                           min_users=None, fields=None):
+    frames = {}
+    users_done = 0
+    overlap = Counter()  # film id -> finished (non-empty) watchlists it is on
+    watchlists_done = 0
+    for event in iter_profiles_progress('watchlist', usernames, frames):
+        yield event
+        if event['event'] == 'user_done':
+            # Running overlap across the users the client has heard about, counted the way
+            # intersect_watchlists counts it: at least min_users, or else every non-empty watchlist
+            users_done += 1
+            ids = set(frames[event['username']]['id'])
+            if ids:
+                watchlists_done += 1
+                overlap.update(ids)
+            threshold = min_users if min_users is not None else watchlists_done
+            yield {'event': 'partial', 'users_done': users_done,
+                   'common_count': sum(1 for count in overlap.values() if count >= threshold)}
+    error = unloaded_error(usernames, frames)
+    if error:
+        yield error
+        return
+    try:
+        common_watchlist = intersect_watchlists([frames[username] for username in usernames], min_users=min_users)
+        results = watchlist_party_from_common(common_watchlist, genre, director, decade, min_runtime, max_runtime, fields)
+        yield {'event': 'result', 'common_films': results}
+    except Exception as e:
+        yield {'event': 'error', 'error': str(e)}
@@ -0,0 +1,34 @@
+"""Malformed request bodies are rejected with a 400 before any scraping starts."""
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+@pytest.mark.parametrize('usernames', ['alice', ['alice', 3], ['alice', ''], {'alice': 1}])
+def test_blend_matrix_rejects_malformed_usernames(client, usernames):
+    response = client.post('/api/blend_matrix', json={'usernames': usernames})
+    assert response.status_code == 400
+    assert 'usernames' in response.get_json()['error']
+
+def test_blend_matrix_counts_distinct_usernames(client):
+    response = client.post('/api/blend_matrix', json={'usernames': ['alice', 'alice']})
+    assert response.status_code == 400
+
+def test_watchlist_party_rejects_min_users_above_usernames(client):
+    response = client.post('/api/watchlist-party', json={'usernames': ['alice', 'bob'], 'min_users': 3})
+    assert response.status_code == 400
+    assert 'min_users' in response.get_json()['error']
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/watchlist-party', {'usernames': ['alice', 'bob'], 'fields': ['title', 'year']}),
+    ('/api/watchlist-party', {'usernames': ['alice', 'bob'], 'fields': ['title_x', 'overlap']}),  # needs min_users
+    ('/api/top_common_films', {'username1': 'alice', 'username2': 'bob', 'fields': ['title', 'poster']}),
+])
+def test_unknown_fields_are_rejected(client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert 'Unknown fields' in response.get_json()['error']
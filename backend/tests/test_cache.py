@@ -0,0 +1,34 @@
+"""SQLiteCache stays under its byte budget and doesn't turn reads into writes."""
+import cache
+
+
+def test_evicts_least_recently_used_past_max_bytes(tmp_path):
+    store = cache.SQLiteCache(str(tmp_path / 'cache.sqlite3'), max_bytes=10_000)
+    for n in range(30):
+        store.set(f"page:{n}", {'content': 'x' * 1000}, 60)
+    store.evict()
+    assert store.size() <= 10_000
+    assert store.get('page:29') is not None
+    assert store.get('page:0') is None
+
+def test_reads_are_batched(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'TOUCH_RESOLUTION', -1)  # every read wants to refresh accessed_at
+    store = cache.SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    store.set('page:a', {'content': 'a'}, 60)
+    conn = store._conn()
+    changes = conn.total_changes
+    for _ in range(10):
+        assert store.get('page:a') == {'content': 'a'}
+    assert conn.total_changes == changes
+
+    store.flush_touches()
+    assert conn.total_changes == changes + 1
+
+def test_adds_size_to_an_old_cache_file(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    conn = cache.sqlite3.connect(path)
+    conn.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                 " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+    conn.execute("INSERT INTO entries VALUES (?, ?, ?, ?)", ('page:a', '"abc"', 1e12, 0))
+    conn.commit()
+    assert cache.SQLiteCache(path).size() == 5
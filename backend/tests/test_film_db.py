@@ -0,0 +1,61 @@
+"""The columnar film DB keeps its text memory-mapped and decodes only the rows asked for."""
+import csv
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import film_db
+
+COLUMNS = ['link', 'title', 'avg_rating', 'decade', 'directors', 'genres', 'cast', 'runtime']
+FILMS = [
+    ['/film/amelie/', 'Amélie', 4.1, '2000s', "['Jean-Pierre Jeunet']", "['Comedy', 'Romance']", "['Audrey Tautou']", 122],
+    ['/film/ran/', '乱', 4.3, '1980s', "['Akira Kurosawa']", "['Drama', 'War']", '', 162],
+    ['/film/m/', 'M', 4.2, '1930s', "['Fritz Lang']", "['Crime']", "['Peter Lorre']", ''],
+]
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = str(tmp_path / 'films.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(FILMS)
+    return path
+
+def test_text_columns_stay_out_of_the_shared_frame(csv_path):
+    film_db.build_columnar_film_db(csv_path)
+    frame = film_db.get_film_db(csv_path)
+    assert list(frame.index) == [film[0] for film in FILMS]
+    assert set(frame.columns) == {'avg_rating', 'decade', 'runtime'}
+
+def test_columns_read_the_same_as_from_the_csv(csv_path):
+    expected = film_db.read_film_db(csv_path)
+    film_db.build_columnar_film_db(csv_path)
+    rows = np.array([2, 0])
+    columns = ['title', 'avg_rating', 'decade', 'directors', 'cast', 'runtime']
+    got = film_db.read_film_columns(columns, rows=rows, path=csv_path)
+    pd.testing.assert_frame_equal(got, expected.iloc[rows][columns], check_dtype=False, check_categorical=False)
+    assert film_db.read_film_columns(['cast'], path=csv_path)['cast'].isna().tolist() == [False, True, False]
+
+def test_attribute_index_matches_the_csv_build(csv_path):
+    attributes = ['directors', 'genres', 'cast']
+    from_csv = film_db.AttributeIndex(film_db.read_film_db(csv_path), attributes)
+    film_db.build_columnar_film_db(csv_path)
+    from_columns = film_db.get_attribute_index(attributes, path=csv_path)
+    for attr in attributes:
+        assert list(from_columns.vocab[attr]) == list(from_csv.vocab[attr])
+        assert from_columns.token_ids[attr].tolist() == from_csv.token_ids[attr].tolist()
+
+def test_older_builds_fall_back_to_the_csv(csv_path):
+    out_dir = film_db.build_columnar_film_db(csv_path)
+    manifest_path = os.path.join(out_dir, film_db.MANIFEST_NAME)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    del manifest['version']
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    assert not film_db.has_columnar_film_db(csv_path)
@@ -0,0 +1,39 @@
+"""Job records never stay "running" forever when the worker that had them goes away."""
+import threading
+import time
+
+import pytest
+
+import cache
+import jobs
+
+
+@pytest.fixture(autouse=True)
+def store():
+    cache.set_cache(cache.MemoryCache())
+    jobs.set_job_store(jobs.CacheJobStore())
+
+def test_stale_running_job_is_reported_failed(monkeypatch):
+    record = {'id': 'orphan', 'kind': 'blend_matrix', 'status': 'running', 'created_at': time.time() - 10,
+              'result': None, 'error': None}
+    jobs.get_job_store().save(record)
+    assert jobs.get_job('orphan')['status'] == 'running'
+
+    monkeypatch.setattr(jobs, 'JOB_TIMEOUT', 5)
+    job = jobs.get_job('orphan')
+    assert job['status'] == 'failed' and 'timed out' in job['error']
+    assert jobs.get_job_store().load('orphan')['status'] == 'failed'
+
+def test_abandoned_jobs_fail_and_never_start():
+    started = threading.Barrier(jobs.JOB_WORKERS + 1)
+    release = threading.Event()
+    blockers = [jobs.submit('block', lambda: (started.wait(5), release.wait(5))) for _ in range(jobs.JOB_WORKERS)]
+    started.wait(5)  # every pool thread is busy, so the next job stays queued
+    queued = jobs.submit('blend_matrix', lambda: 'ran')
+    assert jobs.abandon_queued() == 1
+    release.set()
+    jobs._job_pool.submit(lambda: None).result(5)
+    time.sleep(0.1)
+    job = jobs.get_job(queued)
+    assert job['status'] == 'failed' and 'restarted' in job['error']
+    assert all(jobs.get_job(job_id)['status'] in ('running', 'done') for job_id in blockers)
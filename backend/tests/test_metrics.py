@@ -0,0 +1,54 @@
+"""With a shared metrics directory, /metrics sums every worker's counts, including exited ones."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    return tmp_path
+
+def other_worker(directory, pid, retries):
+    metrics.write_json(metrics.snapshot_path(str(directory), pid),
+                       {'blend_fetch_retries_total': [[[], retries]],
+                        'blend_span_seconds': [[['parse'], [1] + [0] * len(metrics.LATENCY_BUCKETS) + [0.0005]]]})
+
+def sample(text, name):
+    return next(float(line.split()[-1]) for line in text.splitlines() if line.startswith(name + ' '))
+
+def test_render_sums_workers(metrics_dir):
+    own = metrics.fetch_retries.value()
+    other_worker(metrics_dir, 999001, 5)
+    other_worker(metrics_dir, 999002, 7)
+    text = metrics.render()
+    assert sample(text, 'blend_fetch_retries_total') == own + 12
+    assert sample(text, 'blend_span_seconds_count{span="parse"}') >= 2
+
+def test_exited_worker_counts_are_kept(metrics_dir):
+    own = metrics.fetch_retries.value()
+    other_worker(metrics_dir, 999001, 5)
+    metrics.archive_snapshot(999001)
+    other_worker(metrics_dir, 999003, 2)  # its replacement
+    metrics.archive_snapshot(999003)
+    assert not (metrics_dir / '999001.json').exists()
+    assert sample(metrics.render(), 'blend_fetch_retries_total') == own + 7
+
+def test_per_process_without_directory(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', None)
+    metrics.fetch_retries.inc()
+    assert sample(metrics.render(), 'blend_fetch_retries_total') == metrics.fetch_retries.value()
+
+def test_app_loads_without_fcntl():
+    # python app.py on Windows: no fcntl, and no metrics directory
+    code = ("import sys; sys.modules['fcntl'] = None; import app; "
+            "assert b'blend_http_request_seconds' in app.app.test_client().get('/metrics').data")
+    env = dict(os.environ)
+    env.pop('BLEND_METRICS_DIR', None)
+    subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env, check=True)
@@ -0,0 +1,144 @@
+"""A films list with a page that fails after its retries must not become the cached snapshot."""
+import asyncio
+import re
+import threading
+import time
+
+import pytest
+
+import async_scraper
+import cache
+import utils
+
+PAGES = 4
+PER_PAGE = 3
+
+
+class FakeSite:
+    """Serves a user's films list as numbered pages, newest first, with some pages failing."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.added = 0  # films logged since the first scrape, in front of the rest
+        self.parsed_on = set()  # names of the threads pages were parsed on
+
+    def rows(self, page):
+        first = (page - 1) * PER_PAGE - self.added
+        return [(str(n), f"Film {n}", 4.0, False, f"/film/film-{n}/") for n in range(first, first + PER_PAGE)]
+
+    def page_number(self, url):
+        match = re.search(r'/page/(\d+)/$', url)
+        return int(match.group(1)) if match else 1
+
+    async def fetch_async(self, url, *args, **kwargs):
+        page = self.page_number(url)
+        return None if page in self.failing else utils.CachedResponse(url, f"page {page}")
+
+    def list_page(self, list_type, content):
+        self.parsed_on.add(threading.current_thread().name)
+        return self.rows(int(content.split()[-1])), PAGES + self.added // PER_PAGE
+
+    def get_parser(self):
+        return self
+
+
+SCRAPERS = [utils.scrape_films, lambda username: async_scraper.run(async_scraper.scrape_films_async(username))]
+
+
+@pytest.fixture
+def site(monkeypatch):
+    site = FakeSite()
+    cache.set_cache(cache.MemoryCache())
+    monkeypatch.setattr(async_scraper, 'get_parser', site.get_parser)
+    monkeypatch.setattr(async_scraper, 'fetch_url_async', site.fetch_async)
+    return site
+
+def expire_snapshot(username):
+    snapshot = utils.load_profile_snapshot('films', username)
+    snapshot['fetched_at'] -= utils.PROFILE_TTL + 1
+    cache.get_cache().set(f"profile:films:{username}", snapshot, utils.SNAPSHOT_TTL)
+
+@pytest.mark.parametrize('scrape', SCRAPERS, ids=['sync', 'async'])
+def test_failed_page_is_not_cached(site, scrape):
+    site.failing = {3}
+    df = scrape('alice')
+    assert len(df) == (PAGES - 1) * PER_PAGE
+    assert utils.load_profile_snapshot('films', 'alice') is None
+    assert 'fetched_at' not in df.attrs
+
+    site.failing = set()
+    assert len(scrape('alice')) == PAGES * PER_PAGE
+    assert len(utils.load_profile_snapshot('films', 'alice')['rows']) == PAGES * PER_PAGE
+
+@pytest.mark.parametrize('scrape', SCRAPERS, ids=['sync', 'async'])
+def test_failed_incremental_page_keeps_previous_snapshot(site, scrape):
+    scrape('alice')
+    expire_snapshot('alice')
+    before = utils.load_profile_snapshot('films', 'alice')
+
+    # Pages 1 and 2 are all new films, so the incremental walk needs page 2 too
+    site.added = 2 * PER_PAGE
+    site.failing = {2}
+    scrape('alice')
+    assert utils.load_profile_snapshot('films', 'alice') == before
+
+def test_sync_pages_stream_from_the_shared_scrape(site):
+    pages = utils.iter_profile_pages('films', 'alice')
+    seen = []
+    while True:
+        try:
+            seen.append(next(pages))
+        except StopIteration as done:
+            df = done.value
+            break
+    assert [page for page, _, _ in seen] == list(range(1, PAGES + 1))
+    assert len(df) == sum(len(rows) for _, _, rows in seen) == PAGES * PER_PAGE
+
+def test_pages_are_parsed_off_the_event_loop(site):
+    utils.scrape_films('alice')
+    assert site.parsed_on and 'scrape-loop' not in site.parsed_on
+
+def test_streamed_and_blend_scrapes_share_one_upstream_scrape(site, monkeypatch):
+    fetched = []
+    started = threading.Event()
+
+    async def slow_fetch(url, *args, **kwargs):
+        fetched.append(url)
+        started.set()
+        await asyncio.sleep(0.05)
+        return await site.fetch_async(url)
+
+    monkeypatch.setattr(async_scraper, 'fetch_url_async', slow_fetch)
+    streamed = []
+    thread = threading.Thread(target=lambda: streamed.extend(utils.iter_profile_pages('films', 'alice')))
+    thread.start()
+    started.wait()
+    df = async_scraper.run(async_scraper.scrape_films_async('alice'))
+    thread.join()
+    assert len(fetched) == PAGES
+    assert len(df) == PAGES * PER_PAGE
+    assert [page for page, _, _ in streamed] == list(range(1, PAGES + 1))
+
+@pytest.mark.parametrize('scrape', SCRAPERS, ids=['sync', 'async'])
+def test_unloadable_profile_raises(site, scrape):
+    site.failing = {1}
+    with pytest.raises(utils.ProfileNotFound) as error:
+        scrape('nobody')
+    assert error.value.username == 'nobody'
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/calculate_blend', {'username1': 'alice', 'username2': 'nobody'}),
+    ('/api/blend_matrix', {'usernames': ['alice', 'nobody']}),
+    ('/api/watchlist-party', {'usernames': ['alice', 'nobody']}),
+])
+def test_unloadable_profile_is_a_404_naming_the_user(site, monkeypatch, path, body):
+    import app
+
+    async def fetch(url, *args, **kwargs):
+        return None if '/nobody/' in url else await site.fetch_async(url)
+
+    monkeypatch.setattr(async_scraper, 'fetch_url_async', fetch)
+    response = app.app.test_client().post(path, json=body)
+    assert response.status_code == 404
+    assert response.get_json()['username'] == 'nobody'
+    assert 'nobody' in response.get_json()['error']
@@ -0,0 +1,37 @@
+"""Per-request profiling is opt-in, so Server-Timing stage timings aren't exposed by default."""
+import time
+from types import SimpleNamespace
+
+import app
+import metrics
+
+
+def test_profiling_is_off_by_default():
+    response = app.app.test_client().get('/health?profile=1', headers={'X-Blend-Profile': '1'})
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+
+def test_profiling_when_allowed(monkeypatch):
+    monkeypatch.setattr(metrics, 'PROFILING_ALLOWED', True)
+    response = app.app.test_client().get('/health?profile=1')
+    assert 'Server-Timing' in response.headers
+
+def test_blend_matrix_times_only_the_math(monkeypatch):
+    import numpy as np
+    import profiles
+    from utils import BLEND_ATTRIBUTES
+
+    def get_user_profiles(usernames):
+        time.sleep(0.2)  # scraping
+        empty = (np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+        return [SimpleNamespace(film_ids=np.array([1, 2]), film_ratings=np.array([4.0, 3.0]),
+                                attribute_counts={attr: empty for attr in BLEND_ATTRIBUTES}) for _ in usernames]
+
+    monkeypatch.setattr(profiles, 'get_user_profiles', get_user_profiles)
+    profile, token = metrics.start_profile()
+    try:
+        assert profiles.blend_matrix(['alice', 'bob']) == [[None, 100], [100, None]]
+    finally:
+        metrics.finish_profile(token)
+    seconds, count = profile.totals()['similarity']
+    assert count == 1 and seconds < 0.2
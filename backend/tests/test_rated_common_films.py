@@ -0,0 +1,117 @@
+"""find_rated_common_films reads /films/by/entry-rating/ only as far as the top k needs, and keeps what it read."""
+import random
+import re
+
+import pytest
+
+import async_scraper
+import cache
+import utils
+
+PER_PAGE = 5
+RATINGS = [0.5 * i for i in range(1, 11)]
+
+
+def by_rating(films):
+    """Letterboxd's /films/by/entry-rating/ order: highest rated first, unrated films last (one entry per film)."""
+    films = list({film[4]: film for film in reversed(films)}.values())
+    return sorted(films, key=lambda film: -1 if film[2] is None else film[2], reverse=True)
+
+def make_films(rng, count, unrated_share=0.2):
+    films = []
+    for n in rng.sample(range(count * 2), count):
+        rating = None if rng.random() < unrated_share else rng.choice(RATINGS)
+        films.append((str(n), f"Film {n}", rating, False, f"/film/film-{n}/"))
+    return films
+
+
+class FakeSite:
+    """Serves each user's films in the given order, PER_PAGE to a page, counting the pages fetched."""
+
+    def __init__(self, lists):
+        self.lists = lists
+        self.fetched = []
+
+    async def fetch(self, url, *args, **kwargs):
+        match = re.search(r'/([\w-]+)/films/by/entry-rating/(?:page/(\d+)/)?$', url)
+        assert match, url
+        self.fetched.append(url)
+        return utils.CachedResponse(url, f"{match.group(1)} {match.group(2) or 1}")
+
+    def list_page(self, list_type, content):
+        username, page = content.decode().split()
+        films = self.lists[username]
+        page = int(page)
+        return films[(page - 1) * PER_PAGE:page * PER_PAGE], max(1, -(-len(films) // PER_PAGE))
+
+    def get_parser(self):
+        return self
+
+    def pages(self):
+        return sum(max(1, -(-len(films) // PER_PAGE)) for films in self.lists.values())
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    cache.set_cache(cache.MemoryCache())
+
+    def serve(lists):
+        site = FakeSite(lists)
+        monkeypatch.setattr(async_scraper, 'fetch_url_async', site.fetch)
+        monkeypatch.setattr(async_scraper, 'get_parser', site.get_parser)
+        return site
+    return serve
+
+def best_sums(lists, k):
+    rows = [[dict(zip(utils.LIST_COLUMNS['films'], film)) for film in films] for films in lists.values()]
+    return [utils.rank_key(pair) for pair in utils.top_pairs(utils.join_on_film(*rows, ['link'], ['title']), k)]
+
+def two_users(seed, size=60):
+    rng = random.Random(seed)
+    shared = make_films(rng, size)
+    return {'alice': by_rating(shared[:size // 2] + make_films(rng, size)[:size // 2]),
+            'bob': by_rating(shared[size // 4:] + make_films(rng, size)[:size // 4])}
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('k', [1, 4, 50])
+def test_top_k_matches_the_full_join(serve, seed, k):
+    lists = two_users(seed)
+    serve(lists)
+    top = utils.find_rated_common_films('alice', 'bob', k)
+    assert [utils.rank_key(pair) for pair in top] == best_sums(lists, k)
+
+def test_stops_early_when_unrated_films_come_last(serve):
+    lists = two_users(0)
+    site = serve(lists)
+    utils.find_rated_common_films('alice', 'bob', 1)
+    assert len(site.fetched) < site.pages()
+
+def test_out_of_order_pages_are_read_to_the_end(serve):
+    # The early stop trusts the rating order; a list that breaks it must not be cut short
+    lists = {username: list(reversed(films)) for username, films in two_users(1).items()}
+    site = serve(lists)
+    top = utils.find_rated_common_films('alice', 'bob', 3)
+    assert [utils.rank_key(pair) for pair in top] == best_sums(lists, 3)
+    assert len(site.fetched) == site.pages()
+
+def test_complete_read_becomes_the_films_snapshot(serve):
+    lists = two_users(2)
+    site = serve(lists)
+    utils.find_rated_common_films('alice', 'bob', 1000)
+    for username, films in lists.items():
+        assert len(utils.load_profile_snapshot('films', username)['rows']) == len(films)
+
+    site.fetched.clear()
+    top = utils.find_rated_common_films('alice', 'bob', 4)
+    assert site.fetched == []
+    assert [utils.rank_key(pair) for pair in top] == best_sums(lists, 4)
+
+def test_partial_read_is_resumed(serve):
+    lists = two_users(3)
+    site = serve(lists)
+    utils.find_rated_common_films('alice', 'bob', 1)
+    first = set(site.fetched)
+    site.fetched.clear()
+    top = utils.find_rated_common_films('alice', 'bob', 12)
+    assert not first & set(site.fetched)
+    assert [utils.rank_key(pair) for pair in top] == best_sums(lists, 12)
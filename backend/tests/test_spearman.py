@@ -0,0 +1,52 @@
+"""profiles.spearman and average_ranks stand in for scipy.stats.spearmanr and rankdata.
+
+The expected values were computed once with scipy (spearmanr(x, y).correlation and
+rankdata(x)), so the server doesn't need scipy to check they still agree.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from profiles import average_ranks, grouped_average_ranks, spearman
+
+RANKS = [
+    ([4.0, 4.0, 3.5, 5.0, 3.5, 2.0], [4.5, 4.5, 2.5, 6.0, 2.5, 1.0]),
+    ([3.0, 4.5, 4.5, 5.0, 2.0, 2.0], [3.0, 4.5, 4.5, 6.0, 1.5, 1.5]),
+    ([3.0, 3.0, 3.0, 4.0], [2.0, 2.0, 2.0, 4.0]),
+    ([2.0, 2.0], [1.5, 1.5]),
+    ([1.0], [1.0]),
+]
+CORRELATIONS = [
+    # ties on both sides
+    ([4.0, 4.0, 3.5, 5.0, 3.5, 2.0], [3.0, 4.5, 4.5, 5.0, 2.0, 2.0], 0.7727272727272726),
+    ([3.0, 3.0, 3.0, 4.0], [1.0, 2.0, 3.0, 4.0], 0.7745966692414834),
+    ([1.0, 2.0, 3.0, 4.0, 5.0], [5.0, 4.0, 3.0, 2.0, 1.0], -1.0),
+    # fewer than three films
+    ([1.0, 2.0], [3.0, 4.0], 1.0),
+    ([1.0, 2.0], [4.0, 3.0], -1.0),
+]
+UNDEFINED = [
+    ([3.0, 3.0, 3.0], [1.0, 2.0, 3.0]),
+    ([1.0, 2.0, 3.0], [2.5, 2.5, 2.5]),
+    ([1.0, 2.0], [3.0, 3.0]),
+    ([1.0], [2.0]),
+]
+
+
+@pytest.mark.parametrize('values, expected', RANKS)
+def test_average_ranks_match_rankdata(values, expected):
+    assert average_ranks(np.array(values)).tolist() == expected
+
+def test_grouped_ranks_match_per_group_ranks():
+    values = np.array([value for values, _ in RANKS for value in values])
+    groups = np.repeat(np.arange(len(RANKS)), [len(values) for values, _ in RANKS])
+    assert grouped_average_ranks(groups, values).tolist() == [rank for _, ranks in RANKS for rank in ranks]
+
+@pytest.mark.parametrize('x, y, expected', CORRELATIONS)
+def test_spearman_matches_spearmanr(x, y, expected):
+    assert spearman(np.array(x), np.array(y)) == pytest.approx(expected, abs=1e-12)
+
+@pytest.mark.parametrize('x, y', UNDEFINED)
+def test_spearman_is_nan_for_constant_ratings(x, y):
+    assert math.isnan(spearman(np.array(x), np.array(y)))
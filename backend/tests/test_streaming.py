@@ -0,0 +1,50 @@
+"""Progress events of the streamed watchlist party must agree with what the client has seen and gets."""
+import pandas as pd
+import pytest
+
+import streaming
+import utils
+
+WATCHLISTS = {
+    'alice': [1, 2, 3, 4],
+    'bob': [2, 3, 4, 5],
+    'cy': [3, 4, 5, 6],
+    'dee': [],
+}
+
+
+def fake_pages(list_type, username):
+    ids = WATCHLISTS[username]
+    rows = [{'id': str(film_id), 'title': f"Film {film_id}", 'link': f"/film/film-{film_id}/"} for film_id in ids]
+    yield 1, 1, rows
+    return pd.DataFrame(rows, columns=['id', 'title', 'link'])
+
+@pytest.fixture(autouse=True)
+def fake_scrapes(monkeypatch):
+    monkeypatch.setattr(streaming, 'iter_profile_pages', fake_pages)
+    monkeypatch.setattr(streaming, 'watchlist_party_from_common',
+                        lambda common, *args: sorted(int(film_id) for film_id in common.get('id', [])))
+
+@pytest.mark.parametrize('min_users', [None, 1, 2, 3, 4])
+def test_partial_counts_match_the_stream_and_the_result(min_users):
+    events = list(streaming.stream_watchlist_party(list(WATCHLISTS), min_users=min_users))
+    user_done = 0
+    for event in events:
+        if event['event'] == 'user_done':
+            user_done += 1
+        elif event['event'] == 'partial':
+            assert event['users_done'] == user_done
+    partials = [event for event in events if event['event'] == 'partial']
+    assert partials[-1]['users_done'] == len(WATCHLISTS)
+    assert partials[-1]['common_count'] == len(events[-1]['common_films'])
+
+def test_unloadable_user_ends_the_stream_with_an_error_naming_them(monkeypatch):
+    def pages(list_type, username):
+        if username == 'nobody':
+            raise utils.ProfileNotFound(username, list_type)
+        return fake_pages(list_type, username)
+
+    monkeypatch.setattr(streaming, 'iter_profile_pages', pages)
+    events = list(streaming.stream_watchlist_party(['alice', 'nobody']))
+    assert events[-1]['event'] == 'error'
+    assert events[-1]['usernames'] == ['nobody']
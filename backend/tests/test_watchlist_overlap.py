@@ -0,0 +1,26 @@
+"""intersect_watchlists' "on at least K of N watchlists" mode has one result shape for every K."""
+import pandas as pd
+import pytest
+
+import utils
+
+
+def watchlist(*ids):
+    return pd.DataFrame({'id': list(ids), 'title': [f"Film {i}" for i in ids], 'link': [f"/film/{i}/" for i in ids]})
+
+WATCHLISTS = [watchlist('1', '2', '3'), watchlist('2', '3', '4'), watchlist('3', '2', '5')]
+
+
+@pytest.mark.parametrize('min_users, expected', [(1, ['2', '3', '1', '4', '5']), (2, ['2', '3']), (3, ['2', '3'])])
+def test_min_users_always_ranks_by_overlap(min_users, expected):
+    common = utils.intersect_watchlists(WATCHLISTS, min_users=min_users)
+    assert 'overlap' in common.columns
+    assert common['id'].tolist() == expected
+
+def test_min_users_above_watchlist_count_keeps_nothing():
+    assert utils.intersect_watchlists(WATCHLISTS, min_users=5).empty
+
+def test_all_users_matches_plain_intersection():
+    plain = utils.intersect_watchlists(WATCHLISTS)
+    ranked = utils.intersect_watchlists(WATCHLISTS, min_users=len(WATCHLISTS))
+    pd.testing.assert_frame_equal(ranked.drop(columns='overlap'), plain)
@@ -1,16 +1,28 @@
+import datetime
+import heapq
+import math
+import os
+import queue
 import time
 import pandas as pd
-from scipy.stats import spearmanr
-from collections import Counter
-import random
-import requests
-import json
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from cache import get_cache, PROFILE_TTL, SNAPSHOT_TTL, FULL_SYNC_INTERVAL
+from film_db import (
+    LOCAL_DB_PATH, get_film_db, read_film_columns, get_attribute_index, join_film_db, get_poster_urls, get_filter_index,
+)
+from parsers import get_parser
+from fetcher import MAX_FETCH_WORKERS
+from metrics import timed, scraped_entries
+import debug_artifacts
+from serialize import records
 
 # Constants
-LOCAL_DB_PATH = 'mother22.csv'
-DOMAIN = "https://letterboxd.com"
+DOMAIN = os.environ.get("BLEND_LETTERBOXD_URL", "https://letterboxd.com")  # overridden by the benchmark stand-in
+
+# Attributes for Jaccard similarity calculation and their weights
+BLEND_ATTRIBUTES = ['decade', 'directors', 'genres', 'themes', 'studios', 'countries',
+                    'language', 'cinematographer', 'composers', 'cast', 'popularity_class', 'duration_class']
+BLEND_WEIGHTS = [1.5, 2, 2, 1, 1, 1.25, 1.5, 0.85, 0.8, 1, 1.5, 1.25]  # Adjust weights as needed
 
 #HEADERS = {
 #    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -23,435 +35,511 @@ HEADERS = {
     "Accept-Language": "en-US,en;q=0.9",
 }
 
-session = requests.Session()
-session.headers.update(HEADERS)
-
-def transform_ratings(r):
-    stars = {
-        "★": 1, "★★": 2, "★★★": 3, "★★★★": 4, "★★★★★": 5,
-        "½": 0.5, "★½": 1.5, "★★½": 2.5, "★★★½": 3.5, "★★★★½": 4.5
-    }
-    return stars.get(r, None)
-
-def scrape_diary(username):
-    movies_dict = {
-        'id': [], 'title': [], 'rating': [], 'date': [], 'link': []
-    }
-
-    base_url = f"{DOMAIN}/{username}/films/diary/"
-    first_page = fetch_url(base_url)
-    if not first_page:
-        print(f"Failed to load diary for {username}")
-        return pd.DataFrame(movies_dict)
-
-    soup = BeautifulSoup(first_page.content, 'html.parser')
-
-    # Find number of pages
-    li_pagination = soup.find_all("li", class_="paginate-page")
-    pages = int(li_pagination[-1].get_text()) if li_pagination else 1
-
-    for i in range(1, pages + 1):
-        url = f"{DOMAIN}/{username}/films/diary/page/{i}/"
-        response = fetch_url(url)
-        if not response:
-            continue
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        diary_entries = soup.find_all("tr", class_="diary-entry-row")
-
-        for entry in diary_entries:
-            title_tag = entry.find("h3", class_="headline-3 prettify").find("a")
-            if not title_tag:
-                continue
-
-            movie_id = entry.get("data-object-id", "").split(":")[-1]
-            title = title_tag.text.strip()
-            link = entry.find("td", class_="td-actions")["data-film-link"].strip()
-
-            date_link_tag = entry.find("td", class_="td-day").find("a", href=True)
-            diary_date = date_link_tag["href"].split("/for/")[-1].strip() if date_link_tag else "Unknown"
-
-            rating_tag = entry.find("td", class_="td-rating")
-            rating = None
-            if rating_tag and rating_tag.find("span", class_="rating"):
-                rating_text = rating_tag.find("span", class_="rating").text.strip()
-                rating = transform_ratings(rating_text)
-
-            movies_dict['id'].append(movie_id)
-            movies_dict['title'].append(title)
-            movies_dict['rating'].append(rating)
-            movies_dict['date'].append(diary_date)
-            movies_dict['link'].append(link)
-
-        time.sleep(0.2)  # avoid hammering the site
-
-    print(f" Scraped {len(movies_dict['title'])} diary entries for {username}")
-    return pd.DataFrame(movies_dict)
-
-
-def fetch_url(url, max_retries=3, timeout=10):
-    for attempt in range(1, max_retries + 1):
-        try:
-            response = session.get(url, headers= HEADERS, timeout=timeout)
-            if response.status_code == 200:
-                return response
-            elif response.status_code == 404:
-                return None
-        except Exception as e:
-            print(f"Error: {e} on {url}")
-        time.sleep(0.5)
-    return None
+class ProfileNotFound(Exception):
+    """A user's list couldn't be loaded at all: no such user, or Letterboxd didn't answer."""
 
-def parse_movies(soup):
-    ul = soup.find("ul", class_="poster-list")
-    if not ul:
-        return []
+    def __init__(self, username, list_type):
+        super().__init__(f"Couldn't load the {list_type} of Letterboxd user '{username}'. Check the username.")
+        self.username = username
+        self.list_type = list_type
 
-    movies = []
-    for li in ul.find_all("li"):
-        try:
-            div = li.find("div")
-            film_id = div['data-film-id']
-            title = li.find('img')['alt']
-            rating_str = li.find('p', class_="poster-viewingdata").get_text(strip=True)
-            rating = transform_ratings(rating_str)
-            liked = li.find('span', class_='like') is not None
-            link = div['data-target-link']
-            movies.append((film_id, title, rating, liked, link))
-        except Exception:
-            continue
-    return movies
-    
-def scrape_films(username):
-    movies_dict = {'id': [], 'title': [], 'rating': [], 'liked': [], 'link': []}
-    base_url = f"{DOMAIN}/{username}/films/"
-    first_response = fetch_url(base_url)
+class CachedResponse:
+    """Stand-in for a requests.Response rebuilt from a cached page body after a 304."""
+    status_code = 200
 
-    if not first_response:
-        print(f"Failed to load profile for {username}")
-        return pd.DataFrame(movies_dict)
+    def __init__(self, url, text):
+        self.url = url
+        self.text = text
+        self.content = text.encode('utf-8')
 
-    soup = BeautifulSoup(first_response.content, 'html.parser')
-    movies = parse_movies(soup)
+def load_profile_snapshot(list_type, username):
+    """Return the stored snapshot dict for a user's films/diary/watchlist, or None."""
+    return get_cache().get(f"profile:{list_type}:{username.lower()}")
 
-    try:
-        last_page = int(soup.select("li.paginate-page")[-1].get_text(strip=True))
-    except:
-        last_page = 1
+def snapshot_frame(snapshot):
+    df = pd.DataFrame(snapshot['rows'], columns=snapshot['columns'])
+    df.attrs['fetched_at'] = snapshot['fetched_at']
+    return df
+
+def load_cached_profile(list_type, username):
+    """Return the cached DataFrame for a user's films/diary/watchlist if it is still fresh."""
+    snapshot = load_profile_snapshot(list_type, username)
+    if snapshot is None or time.time() - snapshot['fetched_at'] > PROFILE_TTL:
+        return None
+    return snapshot_frame(snapshot)
+
+def store_cached_profile(list_type, username, df, full_synced_at=None):
+    now = time.time()
+    get_cache().set(
+        f"profile:{list_type}:{username.lower()}",
+        {
+            'fetched_at': now,
+            'full_synced_at': full_synced_at or now,
+            'columns': list(df.columns),
+            'rows': df.to_dict(orient='records'),
+        },
+        SNAPSHOT_TTL,
+    )
+    # Lets downstream caches (e.g. profiles.UserProfile) tell which scrape a frame came from
+    df.attrs['fetched_at'] = now
+
+def merge_snapshot_delta(snapshot, delta):
+    """Put freshly scraped rows in front of the snapshot, replacing stale copies by id."""
+    delta_ids = {row['id'] for row in delta}
+    merged = delta + [row for row in snapshot['rows'] if row['id'] not in delta_ids]
+    return pd.DataFrame(merged, columns=snapshot['columns'])
+
+def list_page_url(list_type, username, page):
+    base_url = f"{DOMAIN}/{username}/{LIST_PATHS[list_type]}"
+    return base_url if page == 1 else f"{base_url}page/{page}/"
+
+def iter_profile_pages(list_type, username, use_cache=True, incremental=True):
+    """Yield (page, last_page, rows) as each page of a user's films/diary/watchlist is parsed.
+
+    rows are dicts keyed by LIST_COLUMNS[list_type]. The generator returns the complete
+    DataFrame, as collect_profile() would, and shares the scrape with any other caller asking
+    for the same list at the same time (see async_scraper.scrape_list_async).
+    """
+    from async_scraper import schedule, scrape_list_async
+
+    pages = queue.Queue()
+    future = schedule(scrape_list_async(list_type, username, use_cache, incremental,
+                                        on_page=lambda *page: pages.put(page)))
+    future.add_done_callback(lambda _: pages.put(None))
+    while True:
+        page = pages.get()
+        if page is None:
+            return future.result()
+        yield page
+
+def collect_profile(list_type, username, use_cache=True, incremental=True):
+    """A user's films/diary/watchlist as a DataFrame (see async_scraper.scrape_list_async)."""
+    from async_scraper import run, scrape_list_async
+    return run(scrape_list_async(list_type, username, use_cache, incremental))
+
+def scrape_diary(username, use_cache=True, incremental=True, since=None):
+    """A user's diary; with since='YYYY/MM/DD', only the entries logged on or after that day."""
+    from async_scraper import run, scrape_diary_async
+    return run(scrape_diary_async(username, use_cache, incremental, since))
+
+def diary_window_start(since=None, years=None):
+    """The first diary day ('YYYY/MM/DD') of a window given as a date / 'YYYY-MM-DD', or `years` back from today.
+
+    None (the whole diary) when neither is given.
+    """
+    if since is not None:
+        if isinstance(since, str):
+            since = datetime.date.fromisoformat(since.replace('/', '-'))
+        return since.strftime('%Y/%m/%d')
+    if years is not None:
+        return (datetime.date.today() - datetime.timedelta(days=round(365.25 * years))).strftime('%Y/%m/%d')
+    return None
 
-    for page in range(2, last_page + 1):
-        url = f"{base_url}page/{page}/"
-        response = fetch_url(url)
-        if response:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            movies.extend(parse_movies(soup))
-        time.sleep(0.3)
+def before_window(date, since):
+    # Entries without a day link ('Unknown') can't be placed, so they never end the window
+    return date[:1].isdigit() and date[:10] < since
 
-    for film_id, title, rating, liked, link in movies:
-        movies_dict['id'].append(film_id)
-        movies_dict['title'].append(title)
-        movies_dict['rating'].append(rating)
-        movies_dict['liked'].append(liked)
-        movies_dict['link'].append(link)
+def diary_window(df, since):
+    """Diary rows logged on or after `since` (all of them when since is None)."""
+    if since is None or df.empty:
+        return df
+    keep = [not before_window(date, since) for date in df['date']]
+    return df[keep].reset_index(drop=True)
 
-    return pd.DataFrame(movies_dict)
+def scrape_films(username, use_cache=True, incremental=True):
+    return collect_profile('films', username, use_cache=use_cache, incremental=incremental)
 
 
 def load_local_database():
-    """Load the local movie database."""
-    return pd.read_csv(LOCAL_DB_PATH)
+    """Load the local movie database with every column, indexed by link."""
+    return read_film_columns()
 
 def merge_with_local_db(df_user, local_db):
     """Merge scraped films with the local database to get attributes."""
-    merged_df = pd.merge(df_user, local_db, on='link', how='left')
+    merged_df = join_film_db(df_user, local_db)
     return merged_df
 
-def calculate_jaccard_similarity(counter1, counter2):
-    """Calculate the Jaccard similarity between two counters."""
-    intersection = sum((counter1 & counter2).values())
-    union = sum((counter1 | counter2).values())
+def calculate_jaccard_similarity(counts1, counts2):
+    """Calculate the weighted Jaccard similarity of two sparse (token ids, counts) vectors."""
+    ids1, values1 = counts1
+    ids2, values2 = counts2
+    _, idx1, idx2 = np.intersect1d(ids1, ids2, assume_unique=True, return_indices=True)
+    intersection = int(np.minimum(values1[idx1], values2[idx2]).sum())
+    # sum(max) over the union == sum(a) + sum(b) - sum(min)
+    union = int(values1.sum()) + int(values2.sum()) - intersection
     return intersection / union if union > 0 else 0
 
-def compare_attributes(df_user1, df_user2, attributes, weights):
+def compare_attributes(counts_user1, counts_user2, attributes, weights):
     """Compare attributes between two users using weighted Jaccard similarity."""
     total_weighted_jaccard = 0
 
     for attr, weight in zip(attributes, weights):
-        # Create counters for each attribute
-        counter_user1 = Counter(df_user1[attr].dropna().str.split(', ').sum())
-        counter_user2 = Counter(df_user2[attr].dropna().str.split(', ').sum())
-        
-        # Calculate Jaccard similarity
-        jaccard_similarity = calculate_jaccard_similarity(counter_user1, counter_user2)
+        jaccard_similarity = calculate_jaccard_similarity(counts_user1[attr], counts_user2[attr])
         weighted_jaccard = jaccard_similarity * weight
         total_weighted_jaccard += weighted_jaccard
-        
+
     return total_weighted_jaccard
 
 def calculate_blend_percentage(user1, user2):
     """Calculate the blend percentage between two users."""
-    # Scrape films
-    df_user1 = scrape_films(user1)
-    df_user2 = scrape_films(user2)
-
-    # Load local database
-    local_db = load_local_database()
-
-    # Merge scraped films with local database
-    merged_user1 = merge_with_local_db(df_user1, local_db)
-    merged_user2 = merge_with_local_db(df_user2, local_db)
-
-    # Define attributes for Jaccard similarity calculation and their weights
-    attributes = ['decade', 'directors', 'genres', 'themes', 'studios', 'countries', 
-                  'language', 'cinematographer', 'composers', 'cast', 'popularity_class', 'duration_class']
-    #new code
-    weights = [1.5, 2, 2, 1, 1, 1.25, 1.5, 0.85, 0.8, 1, 1.5, 1.25]  # Adjust weights as needed
-
-    # Calculate total weighted Jaccard similarity
-    total_weighted_jaccard = compare_attributes(merged_user1, merged_user2, attributes, weights)
-    #new code
-    total_weighted_jaccard /= sum(weights)
-    total_weighted_jaccard = min(total_weighted_jaccard, 1) 
-
-    # Find common movies
-    common_movies = pd.merge(df_user1, df_user2, on='link', suffixes=('_user1', '_user2'))
-
-    # Calculate proportion of common films
-    total_movies = len(set(df_user1['link']).union(set(df_user2 ['link'])))
-    proportion_common = len(common_movies) / total_movies if total_movies > 0 else 0
-    #new code
-    proportion_common = min(proportion_common, 1)
-
-    # Filter out unrated movies for Spearman's calculation
-    common_rated_movies = common_movies.dropna(subset=['rating_user1', 'rating_user2'])
-
-    # Calculate Spearman's rank correlation coefficient for ratings
-    if len(common_rated_movies) > 1:
-        spearman_corr = spearmanr(common_rated_movies['rating_user1'], common_rated_movies['rating_user2']).correlation
-        spearman_normalized = min((spearman_corr + 1) / 2, 1)  # Ensure Spearman does not exceed 1
-    else:
-        spearman_normalized = 0
-
-    # Compute blend percentage
-    #blend_percentage = (0.09 * proportion_common) + (0.9 * spearman_normalized) + (0.01 * total_weighted_jaccard)
-    blend_percentage = (0.2 * proportion_common) + (0.9 * spearman_normalized) + (0.15 * total_weighted_jaccard)
-    blend_percentage = min(blend_percentage, 1)
-
-    # Round off the blend percentage to the nearest whole number
-    return round(blend_percentage * 100)
-
-
-def find_top_rated_common_films(username1, username2, top_n=4):
-    # STEP 1: Scrape diaries
-    df_diary1 = scrape_diary(username1)
-    df_diary2 = scrape_diary(username2)
-
-    # Save diaries for debugging
-    df_diary1.to_csv(f'diary_{username1}.csv', index=False)
-    df_diary2.to_csv(f'diary_{username2}.csv', index=False)
-
-    # STEP 2: Find common diary entries (same title + date, many-to-many)
-    common_diary = df_diary1.merge(df_diary2, on=['title', 'date'], how='inner', suffixes=('_user1', '_user2'))
-
-    if not common_diary.empty:
-        # Convert ratings to numeric
-        common_diary['rating_user1'] = pd.to_numeric(common_diary['rating_user1'], errors='coerce')
-        common_diary['rating_user2'] = pd.to_numeric(common_diary['rating_user2'], errors='coerce')
-        common_diary['sum_ratings'] = common_diary['rating_user1'] + common_diary['rating_user2']
-
-        # Sort by combined rating
-        common_diary = common_diary.sort_values(by='sum_ratings', ascending=False)
-
-        print("\n Top-rated common diary films (watched on same date):")
-        for _, row in common_diary.iterrows():
-            print(f"• '{row['title']}' on {row['date']} – {row['rating_user1']} + {row['rating_user2']} = {row['sum_ratings']}")
+    from profiles import get_user_profiles, blend_profiles
+
+    profile1, profile2 = get_user_profiles([user1, user2])
+    return blend_profiles(profile1, profile2)
+
+
+def rating_value(rating):
+    """A scraped rating as a float, NaN when unrated."""
+    return float(rating) if rating is not None and rating == rating else math.nan
+
+def join_on_film(rows1, rows2, keys, shared):
+    """Hash join two users' list rows on `keys`, shaped like a pandas merge with _user1/_user2 suffixes.
+
+    Many-to-many like merge(how='inner'), in rows1 order. Columns in `shared` appear once
+    (from rows1); each pair also gets 'sum_ratings'.
+    """
+    index = {}
+    for row in rows2:
+        index.setdefault(tuple(row[key] for key in keys), []).append(row)
+    return [film_pair(row1, row2, shared)
+            for row1 in rows1 for row2 in index.get(tuple(row1[key] for key in keys), ())]
+
+def film_pair(row1, row2, shared):
+    """One joined row of join_on_film."""
+    pair = {(column if column in shared else f"{column}_user1"): value for column, value in row1.items()}
+    pair.update((f"{column}_user2", value) for column, value in row2.items() if column not in shared)
+    pair['sum_ratings'] = rating_value(row1['rating']) + rating_value(row2['rating'])
+    return pair
+
+def rank_key(pair):
+    # Highest combined rating first; unrated pairs (NaN) after every rated one
+    total = pair['sum_ratings']
+    return total if total == total else -math.inf
+
+def top_pairs(pairs, k):
+    """The k best pairs by sum_ratings (ties keep their order), without sorting all of them."""
+    return heapq.nlargest(k, pairs, key=rank_key)
+
+def films_by_rating_url(username, page):
+    base_url = f"{DOMAIN}/{username}/{FILMS_BY_RATING_PATH}"
+    return base_url if page == 1 else f"{base_url}page/{page}/"
+
+class RatedFilms:
+    """One user's films by link: a complete cached list, or read highest rating first, page by page.
+
+    Reading relies on the order of /films/by/entry-rating/: rated films from the highest rating
+    down, then every unrated film. So no unread film is rated above the lowest rating read so
+    far (`floor`), and once an unrated film shows up none of the unread ones is rated. A page
+    that breaks that order turns `ordered` off, and the list is then read to the end instead.
+    """
+
+    def __init__(self, username, rows=None):
+        self.username = username
+        self.rows = {}
+        self.new_rows = []  # added since the last take_new_rows()
+        self.complete = rows is not None
+        self.ordered = True
+        self.failed = False
+        self.floor = math.inf
+        self.next_page = 1
+        self.last_page = None
+        self.pages_read = 0  # by this call
+        self.fetched_at = time.time()  # when its first page was read
+        for row in rows or ():
+            self.add_row(row)
+
+    @classmethod
+    def from_progress(cls, username, progress):
+        """Resume a partial read stored by store_rating_progress()."""
+        films = cls(username)
+        for row in progress['rows']:
+            films.read_row(row)
+        films.next_page = progress['next_page']
+        films.last_page = progress['last_page']
+        films.complete = films.next_page > films.last_page
+        films.fetched_at = progress['fetched_at']
+        return films
+
+    def add_row(self, row):
+        if row['link'] not in self.rows:
+            self.rows[row['link']] = row
+            self.new_rows.append(row)
+
+    def read_row(self, row):
+        rating = rating_value(row['rating'])
+        rating = rating if rating == rating else -math.inf  # unrated films come last
+        if rating > self.floor:
+            self.ordered = False
+        self.floor = min(self.floor, rating)
+        self.add_row(row)
+
+    def add_page(self, rows, last_page):
+        for row in rows:
+            self.read_row(row)
+        self.pages_read += 1
+        self.next_page += 1
+        self.last_page = last_page
+        self.complete = not rows or self.next_page > last_page
+
+    def ceiling(self):
+        """No film still unread can be rated above this."""
+        return self.floor if self.ordered else math.inf
+
+    def take_new_rows(self):
+        rows, self.new_rows = self.new_rows, []
+        return rows
+
+def bound_sum(rating1, rating2):
+    # As rank_key ranks it: a sum involving an unrated film (NaN / -inf) ranks below every rated one
+    total = rating1 + rating2
+    return total if total == total else -math.inf
+
+def unread_bound(films1, films2, exclude):
+    """The highest sum_ratings a common film not yet paired could still reach (-inf when none can)."""
+    bounds = []
+    for films, other in ((films1, films2), (films2, films1)):
+        if not other.complete:
+            bounds.extend(bound_sum(rating_value(row['rating']), other.ceiling())
+                          for link, row in films.rows.items() if link not in other.rows and link not in exclude)
+    if not (films1.complete or films2.complete):
+        bounds.append(bound_sum(films1.ceiling(), films2.ceiling()))
+    return max(bounds, default=-math.inf)
+
+def cached_film_rows(usernames):
+    """{username: rows} for users whose /films/ list is cached and can be brought up to date cheaply."""
+    from async_scraper import run_all, scrape_films_async
+
+    cached = []
+    for username in usernames:
+        snapshot = load_profile_snapshot('films', username)
+        if snapshot is not None and time.time() - snapshot['full_synced_at'] <= FULL_SYNC_INTERVAL:
+            cached.append(username)
+    frames = run_all(*(scrape_films_async(username) for username in cached)) if cached else []
+    return {username: df.to_dict(orient='records') for username, df in zip(cached, frames)}
+
+def load_rating_progress(username):
+    """A partial /films/by/entry-rating/ read of the user, begun within the last PROFILE_TTL, or None."""
+    progress = get_cache().get(f"profile:films_by_rating:{username.lower()}")
+    if progress is None or time.time() - progress['fetched_at'] > PROFILE_TTL:
+        return None
+    return progress
+
+def store_rating_progress(films):
+    """Keep what was read of a user's rating-ordered list for the next call.
+
+    A read that got to the end without failed pages is the whole /films/ list, so it becomes
+    the user's films snapshot (and later blends don't scrape /films/ again). Otherwise the
+    pages read so far are kept so the next call resumes after them.
+    """
+    rows = list(films.rows.values())
+    if films.complete and not films.failed:
+        store_cached_profile('films', films.username, pd.DataFrame(rows, columns=LIST_COLUMNS['films']))
     else:
-        print("\n No common diary entries with same date found.")
-
+        get_cache().set(f"profile:films_by_rating:{films.username.lower()}",
+                        {'fetched_at': films.fetched_at, 'rows': rows, 'next_page': films.next_page,
+                         'last_page': films.last_page},
+                        PROFILE_TTL)
+
+def rated_films(username, cached):
+    """A user's RatedFilms: their cached /films/ list, else a partial read to resume, else a fresh read."""
+    if username in cached:
+        return RatedFilms(username, cached[username])
+    progress = load_rating_progress(username)
+    return RatedFilms.from_progress(username, progress) if progress else RatedFilms(username)
+
+def read_ahead(films, round_number):
+    """Page numbers to fetch for a user this round: page 1 alone, then twice as many each round."""
+    if films.last_page is None:
+        return [films.next_page]
+    count = min(2 ** round_number, MAX_FETCH_WORKERS)
+    return list(range(films.next_page, min(films.next_page + count, films.last_page + 1)))
+
+def find_rated_common_films(username1, username2, k, exclude=()):
+    """The k best films both users have on /films/ (by combined rating), excluding links in `exclude`.
+
+    Cached film lists are used as they are. Otherwise the list is read sorted by the user's
+    rating (see RatedFilms for the order this relies on), a growing batch of pages at a time
+    fetched concurrently, until no unread film could still make the top k. Each round only
+    pairs up the rows it added, and what was read is cached for the next call.
+    """
+    from async_scraper import run_all, fetch_list_page_async
+
+    exclude = set(exclude)
+    cached = cached_film_rows([username1, username2])
+    films1, films2 = rated_films(username1, cached), rated_films(username2, cached)
+    top = []
+    round_number = 0
+    try:
+        while True:
+            # Pair the rows added since the last round with everything the other user has so far
+            new1, new2 = films1.take_new_rows(), films2.take_new_rows()
+            new1_links = {row['link'] for row in new1}
+            pairs = [film_pair(row, films2.rows[row['link']], ['title']) for row in new1 if row['link'] in films2.rows]
+            pairs += [film_pair(films1.rows[row['link']], row, ['title']) for row in new2
+                      if row['link'] in films1.rows and row['link'] not in new1_links]
+            top = top_pairs(top + [pair for pair in pairs if pair['link_user1'] not in exclude], k)
+            if films1.complete and films2.complete:
+                return top
+            if len(top) == k and rank_key(top[-1]) >= unread_bound(films1, films2, exclude):
+                return top
+
+            reading = [(films, page) for films in (films1, films2) if not films.complete
+                       for page in read_ahead(films, round_number)]
+            pages = run_all(*(fetch_list_page_async('films', films_by_rating_url(films.username, page))
+                              for films, page in reading))
+            for (films, _), page in zip(reading, pages):
+                if films.failed or films.complete:
+                    continue
+                if page is None:
+                    print(f"Failed to load films for {films.username}")
+                    films.failed = films.complete = True  # go with what was read so far
+                    continue
+                films.add_page(*page)
+                scraped_entries.inc(len(page[0]), list='films')
+            round_number += 1
+    finally:
+        for films in (films1, films2):
+            if films.pages_read:
+                store_rating_progress(films)
+
+def find_top_rated_common_films(username1, username2, top_n=4, since=None):
+    """The top_n films both users rated highest: same-day diary entries first, then other common films.
+
+    The /films/ lists are only consulted when the diaries give fewer than top_n matches, and
+    then only read as far as needed (see find_rated_common_films). Films are matched on their
+    link rather than their title, so different films sharing a title don't pair up.
+    """
+    from async_scraper import run_all, scrape_diary_async
+
+    # STEP 1: Scrape diaries (only back to `since` when a window is given)
+    df_diary1, df_diary2 = run_all(scrape_diary_async(username1, since=since), scrape_diary_async(username2, since=since))
+
+    # Keep the diaries for debugging when the (opt-in) artifact sink is enabled
+    debug_artifacts.dump(f'diary_{username1}', df_diary1)
+    debug_artifacts.dump(f'diary_{username2}', df_diary2)
+
+    # STEP 2: Find common diary entries (same film + date, many-to-many), best combined rating first
+    diary_pairs = join_on_film(df_diary1.to_dict(orient='records'), df_diary2.to_dict(orient='records'),
+                               ['link', 'date'], ['title', 'date'])
+    diary_pairs.sort(key=rank_key, reverse=True)
+    common_diary = pd.DataFrame(diary_pairs, columns=COMMON_DIARY_COLUMNS)
     top_diary = common_diary.head(top_n)
     remaining_slots = top_n - len(top_diary)
 
-    # STEP 3: If fewer than top_n, fill with films from /films/
+    # STEP 3: If fewer than top_n, fill with other common films from /films/
     additional_common = pd.DataFrame()
     if remaining_slots > 0:
-        df_films1 = scrape_films(username1)
-        df_films2 = scrape_films(username2)
-
-        # Merge on title
-        common_films = pd.merge(df_films1, df_films2, on='title', suffixes=('_user1', '_user2'))
-
-        if not common_films.empty:
-            # Exclude diary matches
-            already_seen_titles = set(common_diary['title'])
-            common_films = common_films[~common_films['title'].isin(already_seen_titles)]
-
-            # Calculate combined ratings
-            common_films['rating_user1'] = pd.to_numeric(common_films['rating_user1'], errors='coerce')
-            common_films['rating_user2'] = pd.to_numeric(common_films['rating_user2'], errors='coerce')
-            common_films['sum_ratings'] = common_films['rating_user1'] + common_films['rating_user2']
-
-            # Sort and take top needed
-            common_films = common_films.sort_values(by='sum_ratings', ascending=False)
-            additional_common = common_films.head(remaining_slots)
-
-            print(f"\n Additional common films from /films/ page (excluding diary):")
-            for _, row in additional_common.iterrows():
-                print(f"• '{row['title']}' – {row['rating_user1']} + {row['rating_user2']} = {row['sum_ratings']}")
-        else:
-            print("\n No additional common films found on /films/ page.")
+        film_pairs = find_rated_common_films(username1, username2, remaining_slots,
+                                             exclude=common_diary['link_user1'])
+        if film_pairs:
+            additional_common = pd.DataFrame(film_pairs, columns=COMMON_FILMS_COLUMNS)
 
     # Combine final result
-    final_top = pd.concat([top_diary, additional_common], ignore_index=True)
-    final_top = final_top.head(top_n)
-
-    if not final_top.empty:
-        final_top.to_csv("common_films.csv", index=False)
-        print(f"\n Final top {top_n} common films saved to 'common_films.csv'.")
-        return final_top, pd.concat([common_diary, additional_common], ignore_index=True)
-    else:
-        print("\n No common films found at all.")
+    if top_diary.empty and additional_common.empty:
         return None, None
+    final_top = pd.concat([df for df in (top_diary, additional_common) if not df.empty], ignore_index=True)
+    debug_artifacts.dump('common_films', final_top)
+    return final_top, pd.concat([df for df in (common_diary, additional_common) if not df.empty], ignore_index=True)
 
 def scrape_profile_avatar(username):
-    url = f"https://letterboxd.com/{username}/"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
-    }
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Request failed: {e}")
-        return None
-
-    soup = BeautifulSoup(response.content, 'html.parser')
-    avatar_span = soup.find("span", class_="avatar -a500 -borderless -large")
-    if avatar_span:
-        img_tag = avatar_span.find("img")
-        if img_tag and img_tag.get('src', '').startswith('http'):
-            return img_tag['src']
-    return None
+    from async_scraper import run, scrape_profile_avatar_async
+    return run(scrape_profile_avatar_async(username))
 
 def scrape_movie_poster(film_url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/122 Safari/537.36'
-    }
-
-    try:
-        # Send a GET request to fetch the HTML content
-        response = requests.get(film_url, headers=headers, timeout=10)
-        if response.status_code != 200:
-            raise ValueError(f"Failed to fetch page, status code: {response.status_code}")
-        
-        html_content = response.content
-
-        # Parse the HTML content using BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
-
-        # Find the <script> tag containing JSON-LD data
-        script_tag = soup.find('script', {'type': 'application/ld+json'})
-
-        if script_tag:
-            # Clean the script content by removing any CDATA comments
-            script_content = script_tag.string.strip().replace('/* <![CDATA[ */', '').replace('/* ]]> */', '')
-
-            # Load the content of the script as JSON
-            json_data = json.loads(script_content)
-
-            # Extract the image URL from the JSON data
-            return json_data.get('image', 'No image found')
-        else:
-            raise ValueError("Could not find the JSON-LD script tag.")
-    
-    except json.JSONDecodeError as e:
-        raise ValueError(f"JSON decode error: {e}")
-    except Exception as e:
-        raise RuntimeError(f"Error fetching poster: {e}")
-
-
-def fetch_page(session, url, max_retries=3, timeout=10):
-    for attempt in range(1, max_retries + 1):
-        try:
-            time.sleep(random.uniform(1.5, 3.5))  # randomized delay
-            response = session.get(url, headers=HEADERS, timeout=timeout)
-            if response.status_code == 200:
-                return response.text
-            elif response.status_code == 404:
-                print(f"[fetch_page] 404 Not Found: {url}")
-                return None
-            else:
-                print(f"[fetch_page] Attempt {attempt}: Failed to fetch {url} - Status code: {response.status_code}")
-        except Exception as e:
-            print(f"[fetch_page] Attempt {attempt}: Exception while fetching {url}: {e}")
-        time.sleep(0.5)  # delay before retry
-    return None
-
-
-def get_total_pages(session, username):
-    """Retrieves the total number of pages in a user's watchlist."""
-    url = f"{DOMAIN}/{username}/watchlist/"
-    soup = BeautifulSoup(fetch_page(session, url), 'html.parser')
-    pagination = soup.find_all("li", class_="paginate-page")
-    return int(pagination[-1].find('a').text.strip()) if pagination else 1
+    from async_scraper import run, scrape_movie_poster_async
+    return run(scrape_movie_poster_async(film_url))
 
-def parse_watchlist_page(content):
-    """Parses a single watchlist page and extracts movie data."""
-    soup = BeautifulSoup(content, 'html.parser')
-    ul = soup.find("ul", class_="poster-list")
-    
-    if not ul:
-        return []
-
-    movies = []
-    for movie in ul.find_all("li"):
-        movies.append({
-            "id": movie.find("div")["data-film-id"],
-            "title": movie.find("img")["alt"],
-            "link": movie.find("div")["data-target-link"]
-        })
-    
-    return movies
 
-def scrape_watchlist(username):
+def scrape_watchlist(username, use_cache=True):
     """Scrapes the watchlist of a given Letterboxd user with optimized requests."""
-    with requests.Session() as session:
-        total_pages = get_total_pages(session, username)
-        urls = [f"{DOMAIN}/{username}/watchlist/page/{i}/" for i in range(1, total_pages + 1)]
-
-        movies = []
-        with ThreadPoolExecutor() as executor:
-            results = executor.map(lambda url: fetch_page(session, url), urls)
-            for content in results:
-                if content:
-                    movies.extend(parse_watchlist_page(content))
-
-    return pd.DataFrame(movies)
-
-def find_common_watchlist(usernames):
-    """Finds the intersection of watchlists among multiple users."""
-    watchlists = [scrape_watchlist(user) for user in usernames]
-    
+    return collect_profile('watchlist', username, use_cache=use_cache)
+
+LIST_PATHS = {'films': 'films/', 'diary': 'films/diary/', 'watchlist': 'watchlist/'}
+LIST_COLUMNS = {
+    'films': ['id', 'title', 'rating', 'liked', 'link'],
+    'diary': ['id', 'title', 'rating', 'date', 'link'],
+    'watchlist': ['id', 'title', 'link'],
+}
+FILMS_BY_RATING_PATH = 'films/by/entry-rating/'  # a user's films, highest rated first
+COMMON_DIARY_COLUMNS = ['id_user1', 'title', 'rating_user1', 'date', 'link_user1',
+                        'id_user2', 'rating_user2', 'link_user2', 'sum_ratings']
+COMMON_FILMS_COLUMNS = ['id_user1', 'title', 'rating_user1', 'liked_user1', 'link_user1',
+                        'id_user2', 'rating_user2', 'liked_user2', 'link_user2', 'sum_ratings']
+# What a "fields" projection can pick from each endpoint's rows
+TOP_COMMON_FILMS_FIELDS = list(dict.fromkeys(COMMON_DIARY_COLUMNS + COMMON_FILMS_COLUMNS)) + ['image_url']
+WATCHLIST_PARTY_FIELDS = ['id', 'title_x', 'link', 'overlap', 'title_y', 'avg_rating', 'decade', 'directors', 'genres',
+                          'runtime', 'image_url']  # title_x from the watchlist, title_y from the film DB
+
+def find_common_watchlist(usernames, min_users=None):
+    """Finds the intersection of watchlists among multiple users, scraping them concurrently."""
+    from async_scraper import run_all, scrape_watchlist_async
+
+    watchlists = run_all(*(scrape_watchlist_async(user) for user in usernames))
+    return intersect_watchlists(watchlists, min_users=min_users)
+
+def watchlist_film_ids(watchlist):
+    """Film ids of a watchlist frame as an int64 array (-1 for any id that isn't a number)."""
+    try:
+        return watchlist['id'].to_numpy().astype(np.int64)
+    except (TypeError, ValueError):
+        return pd.to_numeric(watchlist['id'], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+
+@timed('intersect')
+def intersect_watchlists(watchlists, min_users=None):
+    """Intersects already-scraped watchlist frames on their integer film ids.
+
+    Rows keep the first watchlist's order. With min_users=K, films on at least K of the
+    watchlists are kept instead, ranked by how many watchlists they are on ('overlap'); that
+    holds for every K, so K = N gives the plain intersection with an 'overlap' column and a
+    K above the number of non-empty watchlists gives nothing.
+    """
     # Remove empty watchlists
     watchlists = [wl for wl in watchlists if not wl.empty]
-    
+
     if not watchlists:
         return pd.DataFrame()
-    
-    common_movies = watchlists[0]
-    for wl in watchlists[1:]:
-        common_movies = pd.merge(common_movies, wl, on=["id", "title", "link"])
-        if common_movies.empty:
+
+    if min_users is not None:
+        return rank_watchlist_overlap(watchlists, [watchlist_film_ids(wl) for wl in watchlists], min_users)
+
+    # Smallest watchlist first keeps every intermediate result as small as possible, and an
+    # empty intersection stops before the remaining watchlists are even converted
+    common = None
+    for wl in sorted(watchlists, key=len):
+        film_ids = watchlist_film_ids(wl)
+        common = np.unique(film_ids) if common is None else np.intersect1d(common, film_ids)
+        if len(common) == 0:
             return pd.DataFrame()
 
-    return common_movies
+    first = watchlists[0]
+    keep = np.isin(watchlist_film_ids(first), common) & ~first['id'].duplicated().to_numpy()
+    return first[keep].reset_index(drop=True)
+
+def rank_watchlist_overlap(watchlists, ids, min_users):
+    """Films on at least min_users of the watchlists, most shared first (ties in first-seen order)."""
+    all_rows = pd.concat(watchlists, ignore_index=True)
+    all_ids = np.concatenate(ids)
+    # Count each film once per watchlist, even if a scrape listed it twice
+    unique_ids, overlap = np.unique(np.concatenate([np.unique(film_ids) for film_ids in ids]), return_counts=True)
+    shared = unique_ids[overlap >= max(min_users, 1)]
+    if len(shared) == 0:
+        return pd.DataFrame()
+
+    first_seen = ~pd.Series(all_ids).duplicated().to_numpy() & np.isin(all_ids, shared)
+    common_movies = all_rows[first_seen].reset_index(drop=True)
+    common_movies['overlap'] = overlap[np.searchsorted(unique_ids, all_ids[first_seen])]
+    return common_movies.sort_values('overlap', ascending=False, kind='stable').reset_index(drop=True)
 
 def merge_with_local_dbw(common_watchlist, local_db_path=LOCAL_DB_PATH):
-    """Merges the common watchlist with the local movie database, reading only required columns."""
+    """Merges the common watchlist with the local movie database, keeping only required columns."""
     if common_watchlist.empty:
         return pd.DataFrame()
     
-    local_db = pd.read_csv(local_db_path, usecols=["link", "title", "avg_rating", "genres", "directors", "decade", "runtime"])
-    merged_df = pd.merge(common_watchlist, local_db, on="link", how="left")  # Merge using Letterboxd link
+    # Look up by Letterboxd link, decoding film details only for the films on the list
+    rows = get_film_db(local_db_path).index.get_indexer(common_watchlist['link'])
+    local_db = read_film_columns(["title", "avg_rating", "decade", "directors", "genres", "runtime"],
+                                 rows=np.unique(rows[rows >= 0]), path=local_db_path)
+    merged_df = join_film_db(common_watchlist, local_db)
 
     # Rename title column explicitly if needed
     #if "title_x" in merged_df.columns:
@@ -460,31 +548,32 @@ def merge_with_local_dbw(common_watchlist, local_db_path=LOCAL_DB_PATH):
 
     return merged_df
 
-def filter_common_movies(merged_df, genre=None, director=None, decade=None, min_runtime=None, max_runtime=None):
-    """Filters the merged database by genre, director, decade, and runtime range."""
+def filter_common_movies(merged_df, genre=None, director=None, decade=None, min_runtime=None, max_runtime=None,
+                         local_db_path=LOCAL_DB_PATH):
+    """Filters the merged database by genre, director, decade, and runtime range.
+
+    Genres match exactly (case-insensitive), directors by exact name or else by part of a
+    name, decades by prefix; films without a runtime are always dropped.
+    """
     if merged_df.empty:
         return pd.DataFrame()
-    
-    # Convert runtime to numeric and drop NaNs
-    merged_df["runtime"] = pd.to_numeric(merged_df["runtime"], errors="coerce")
-    merged_df = merged_df.dropna(subset=["runtime"])
-
-    # Apply filters selectively
-    if genre:
-        merged_df = merged_df[merged_df["genres"].str.contains(genre, case=False, na=False)]
-    if director:
-        merged_df = merged_df[merged_df["directors"].str.contains(director, case=False, na=False)]
-    if decade:
-        merged_df = merged_df[merged_df["decade"].astype(str).str.startswith(str(decade))]
-    if min_runtime is not None and max_runtime is not None:
-        merged_df = merged_df[(merged_df["runtime"] >= int(min_runtime)) & (merged_df["runtime"] <= int(max_runtime))]
 
-    return merged_df
+    return get_filter_index(local_db_path).filter(
+        merged_df, genre=genre, director=director, decade=decade, min_runtime=min_runtime, max_runtime=max_runtime
+    )
 
-def get_watchlist_party_results(usernames, genre=None, director=None, decade=None, min_runtime=None, max_runtime=None):
+def get_watchlist_party_results(usernames, genre=None, director=None, decade=None, min_runtime=None, max_runtime=None,
+                                min_users=None, fields=None):
     """Main function to get the final watchlist party recommendations."""
-    common_watchlist = find_common_watchlist(usernames)
-    
+    common_watchlist = find_common_watchlist(usernames, min_users=min_users)
+    return watchlist_party_from_common(common_watchlist, genre, director, decade, min_runtime, max_runtime, fields)
+
+def watchlist_party_from_common(common_watchlist, genre=None, director=None, decade=None, min_runtime=None, max_runtime=None,
+                                fields=None):
+    """Attaches film details to a common watchlist and applies the party filters.
+
+    Returns JSON-ready records (missing values as None), limited to `fields` when given.
+    """
     if common_watchlist.empty:
         return []
     
@@ -500,5 +589,8 @@ def get_watchlist_party_results(usernames, genre=None, director=None, decade=Non
 
     if filtered_movies.empty:
         return []
-    
-    return filtered_movies.to_dict(orient="records")
+
+    # Posters pre-warmed by prewarm_posters.py; films without one are left for the frontend to fetch
+    if fields is None or 'image_url' in fields:
+        filtered_movies = filtered_movies.assign(image_url=filtered_movies['link'].map(get_poster_urls()))
+    return records(filtered_movies, fields)
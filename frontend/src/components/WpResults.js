@@ -81,6 +81,9 @@ function WpResults() {
   
   const fetchPosters = async (movies) => {
     return await Promise.all(movies.map(async (film) => {
+      if (film.image_url && film.image_url.startsWith('http')) {
+        return film;
+      }
       try {
         const posterResponse = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/scrape_poster`, {
           method: 'POST',